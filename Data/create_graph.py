@@ -1,5 +1,5 @@
-import osmnx as ox
 import networkx as nx
+from flood_agent.model.osm_cache import OSMCache  # uruchamiać z katalogu głównego: python -m Data.create_graph
 
 '''
 # Define the place name and network type
@@ -21,12 +21,12 @@ bottom = 50.04133028276119
 right = 19.95277392442152
 top = 50.04696247300208
 
-G_drive = ox.graph_from_bbox((left, bottom, right, top), network_type='drive')
-G_drive = ox.project_graph(G_drive)
+# Driving network (projected to UTM), cached in Data/osm_cache after the first download
+osm = OSMCache()
+G_drive = osm.road_graph((left, bottom, right, top), 'drive')
 
 # Walking network
-G_walk = ox.graph_from_bbox((left, bottom, right, top), network_type='walk')
-G_walk = ox.project_graph(G_walk)
+G_walk = osm.road_graph((left, bottom, right, top), 'walk')
 
 G = nx.Graph()
 
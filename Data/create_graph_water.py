@@ -1,14 +1,14 @@
 import os
 import numpy as np
 import rasterio
-from rasterio.features import rasterize
 from shapely.geometry import box
 from shapely.ops import transform as shp_transform
 from pyproj import CRS, Transformer
-import osmnx as ox
 import networkx as nx
 from rasterio.transform import rowcol
-from rasterio.transform import Affine
+from flood_agent.model.terrain import raster_info, read_window
+from flood_agent.model.osm_cache import OSMCache
+from agent_model.graph_cache import update_graph_cache  # uruchamiać z katalogu głównego: python -m Data.create_graph_water
 
 # -------------------------------
 # Ścieżki i DEM
@@ -16,10 +16,7 @@ from rasterio.transform import Affine
 dem_path = "krakow_merged.tif"
 output_graph_path = "Data/krakow_roads2.graphml"
 
-with rasterio.open(dem_path) as src:
-    height_full = src.read(1)
-    transform = src.transform
-    raster_crs = src.crs
+_, raster_crs, _ = raster_info(dem_path)
 
 '''
 To się zmienia:
@@ -27,14 +24,12 @@ To się zmienia:
 r0, r1 = 2000, 3200
 c0, c1 = 3500, 4800
 
-height = height_full[r0:r1, c0:c1]
-height = height[::6, ::6]
+# tylko wycinek DEM, co 6. komórka (bez czytania całego rastra, z cache na dysku)
+height, transform = read_window(dem_path, (r0, r1, c0, c1), 6)
 
 nrows, ncols = height.shape
 water_map = np.zeros_like(height, dtype=float)
 
-transform = transform * Affine.translation(c0, r0) * Affine.scale(6, 6)
-
 '''
 ^^^^^^
 '''
@@ -51,46 +46,16 @@ raster_crs_proj = CRS.from_epsg(2180)
 to_wgs84 = Transformer.from_crs(raster_crs_proj, "EPSG:4326", always_xy=True).transform
 bbox_poly_wgs = shp_transform(to_wgs84, bbox_poly)
 
-gdf_roads = ox.features_from_polygon(bbox_poly_wgs, {"highway": True})
-roads = gdf_roads.to_crs(raster_crs_proj)
-roads["geometry"] = roads.buffer(5)
-
-roads_raster_full = rasterize(
-    [(geom, 1) for geom in roads.geometry],
-    out_shape=(nrows, ncols),
-    transform=transform,
-    fill=0
-)
+# maska dróg (bufor 5 m) z cache OSM - pobranie z sieci tylko przy pierwszym uruchomieniu
+osm = OSMCache()
+roads_raster_full = osm.feature_mask(bbox_poly_wgs, {"highway": True}, raster_crs_proj, (nrows, ncols), transform,
+                                     buffer=5).astype(np.uint8)
 
 # -------------------------------
 # Pobranie grafu OSM
 # -------------------------------
-left, bottom, right, top = bbox_poly_wgs.bounds
-G_drive = ox.graph_from_bbox(bbox_poly_wgs.bounds, network_type='drive')
-G_drive = ox.project_graph(G_drive, to_crs=raster_crs_proj)
-G_walk = ox.graph_from_bbox(bbox_poly_wgs.bounds, network_type='walk')
-G_walk = ox.project_graph(G_walk, to_crs=raster_crs_proj)
-
-# Dodanie pozycji x,y w CRS DEM
-for n, data in G_drive.nodes(data=True):
-    data['x'] = float(data['x'])
-    data['y'] = float(data['y'])
-for n, data in G_walk.nodes(data=True):
-    data['x'] = float(data['x'])
-    data['y'] = float(data['y'])
-
-G = nx.Graph()
-for u, v, data in G_drive.edges(data=True):
-    length = data.get('length', 1.0)
-    G.add_edge(u, v, length=length, safe='yes')
-for n, data in G_drive.nodes(data=True):
-    G.add_node(n, x=data['x'], y=data['y'])
-
-for u, v, data in G_walk.edges(data=True):
-    length = data.get('length', 1.0)
-    G.add_edge(u, v, length=length, safe='yes')
-for n, data in G_walk.nodes(data=True):
-    G.add_node(n, x=data['x'], y=data['y'])
+# połączone sieci drive + walk w CRS DEM (x, y węzłów), z cache OSM
+G = osm.merged_graph(bbox_poly_wgs.bounds, crs=raster_crs_proj, network_types=("drive", "walk"))
 
 # -------------------------------
 # Funkcja map_depth_to_graph
@@ -129,6 +94,10 @@ pos_array = map_depth_to_graph(G, water_map, roads_raster_full, transform)
 nx.write_graphml(G, output_graph_path)
 print(f"Graph saved to {output_graph_path}")
 
+# binarny cache grafu (ładowany przez build_example_graph zamiast parsowania GraphML)
+cache_path = update_graph_cache(output_graph_path)
+print(f"Graph cache saved to {cache_path}")
+
 
 
 # -------------------------------
@@ -0,0 +1,174 @@
+import numpy as np
+
+CITIZEN = 0
+RESCUER = 1
+
+NO_NODE = -1  # stored in edge_end when the agent stands on a node (current_edge[1] is None)
+
+
+class AgentStore:
+    """
+    Struct-of-arrays storage of the per-agent movement state, indexed by agent slot.
+
+    Fields (one NumPy array each): current edge as node indices (edge_start, edge_end),
+    id of the current edge, progress along it, max_speed, current_speed, state and the
+    agent kind. Agent objects keep only their slot and expose these fields as ordinary
+    attributes through StoreField descriptors, so existing per-agent code keeps working
+    while vectorized updates (see CitizenAgent.step_batch) can work on whole arrays.
+
+    The store also keeps incremental indexes of the slots by current node (edge_start),
+    by directed edge (edge_start, edge_end) and by (kind, state). They are updated by
+    set_edge / set_state / arrive, so every write to those fields must go through them
+    (the descriptors do); queries then cost O(matching agents) instead of O(population).
+    """
+
+    FIELDS = {
+        "edge_start": np.intp,
+        "edge_end": np.intp,
+        "edge_id": np.intp,
+        "progress": np.float64,
+        "max_speed": np.float64,
+        "current_speed": np.float64,
+        "state": np.int64,
+        "kind": np.int8,
+    }
+
+    def __init__(self, model, capacity=1024):
+        self.model = model
+        self.size = 0
+        self.agents = []
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.edge_end[:] = NO_NODE
+        self.edge_id[:] = NO_NODE
+
+        self.by_node = [set() for _ in range(len(model.node_ids))]
+        self.by_edge = {}
+        self.by_state = {}
+
+    def add(self, agent, kind):
+        """Reserves a slot for `agent` and returns it."""
+        if self.size == len(self.progress):
+            self.grow()
+        slot = self.size
+        self.size += 1
+        self.agents.append(agent)
+        self.kind[slot] = kind
+        self.by_node[self.edge_start[slot]].add(slot)
+        self.by_state.setdefault((kind, int(self.state[slot])), set()).add(slot)
+        return slot
+
+    def grow(self):
+        capacity = 2 * len(self.progress)
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            if name in ("edge_end", "edge_id"):
+                new[:] = NO_NODE
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def slots(self, kind):
+        return np.flatnonzero(self.kind[:self.size] == kind)
+
+    def get_edge(self, slot):
+        node_ids = self.model.node_ids
+        end = self.edge_end[slot]
+        return node_ids[self.edge_start[slot]], (node_ids[end] if end != NO_NODE else None)
+
+    def set_edge(self, slot, edge):
+        start, end = edge
+        index = self.model.node_index
+        self.unindex_edge(slot)
+        self.edge_start[slot] = index[start]
+        if end is None:
+            self.edge_end[slot] = NO_NODE
+            self.edge_id[slot] = NO_NODE
+        else:
+            self.edge_end[slot] = index[end]
+            self.edge_id[slot] = self.model.edge_ids.get((self.edge_start[slot], self.edge_end[slot]), NO_NODE)
+        self.index_edge(slot)
+
+    def arrive(self, slots):
+        """Moves `slots` to the end node of their current edge (progress reset, no next node yet)."""
+        for slot in slots:
+            self.unindex_edge(slot)
+        self.edge_start[slots] = self.edge_end[slots]
+        self.edge_end[slots] = NO_NODE
+        self.edge_id[slots] = NO_NODE
+        self.progress[slots] = 0.0
+        for slot in slots:
+            self.index_edge(slot)
+
+    def set_state(self, slots, state):
+        """Sets the state of one slot or an array of slots to `state` (int)."""
+        kinds = self.kind[slots]
+        old_states = self.state[slots]
+        for slot, kind, old in zip(np.atleast_1d(slots).tolist(), np.atleast_1d(kinds).tolist(),
+                                   np.atleast_1d(old_states).tolist()):
+            self.by_state[(kind, old)].discard(slot)
+            self.by_state.setdefault((kind, state), set()).add(slot)
+        self.state[slots] = state
+
+    def set(self, field, slot, value):
+        if field == "state":
+            self.set_state(slot, value)
+        else:
+            getattr(self, field)[slot] = value
+
+    def index_edge(self, slot):
+        start, end = int(self.edge_start[slot]), int(self.edge_end[slot])
+        self.by_node[start].add(slot)
+        if end != NO_NODE:
+            self.by_edge.setdefault((start, end), set()).add(slot)
+
+    def unindex_edge(self, slot):
+        start, end = int(self.edge_start[slot]), int(self.edge_end[slot])
+        self.by_node[start].discard(slot)
+        if end != NO_NODE:
+            on_edge = self.by_edge.get((start, end))
+            if on_edge is not None:
+                on_edge.discard(slot)
+                if not on_edge:
+                    del self.by_edge[(start, end)]
+
+    def at_node(self, node):
+        """Slots of the agents whose current edge starts at node index `node`."""
+        return self.by_node[node]
+
+    def on_edge(self, start, end):
+        """Slots of the agents on the directed edge start -> end (node indices)."""
+        return self.by_edge.get((start, end), set())
+
+    def in_state(self, kind, state):
+        """Slots of the agents of `kind` in `state` (int)."""
+        return self.by_state.get((kind, state), set())
+
+
+class StoreField:
+    """Agent attribute backed by one array of the model's AgentStore."""
+
+    def __init__(self, field, to_python=None):
+        self.field = field
+        self.to_python = to_python
+
+    def __get__(self, agent, owner=None):
+        if agent is None:
+            return self
+        value = getattr(agent.model.agent_store, self.field)[agent.slot]
+        return self.to_python(value) if self.to_python is not None else value
+
+    def __set__(self, agent, value):
+        agent.model.agent_store.set(self.field, agent.slot, getattr(value, "value", value))
+
+
+class StoreEdge:
+    """`current_edge` attribute backed by the AgentStore (tuple of node labels, None for no next node)."""
+
+    def __get__(self, agent, owner=None):
+        if agent is None:
+            return self
+        return agent.model.agent_store.get_edge(agent.slot)
+
+    def __set__(self, agent, edge):
+        agent.model.agent_store.set_edge(agent.slot, edge)
@@ -1,6 +1,10 @@
+import math
+
 import networkx as nx
+import numpy as np
 from agent_model.citizens.citizen_agent import CitizenAgent, CitizenState
 from agent_model.rescue_agent import RescueAgent, RescueState
+from agent_model.agent_store import CITIZEN
 
 class CallCenterAgent:
     """
@@ -9,24 +13,38 @@ class CallCenterAgent:
     - Identify citizens in critical danger.
     - Assign available rescue agents to the closest unsafe citizens.
     - Track rescue states to avoid duplicate assignments.
+
+    Dispatch modes:
+    - "sequential": each citizen in turn gets the closest available rescuer (one shortest path per pair).
+    - "greedy": one Dijkstra per rescuer (or per citizen, whichever side is smaller) builds a cost
+      matrix, then pairs are assigned globally from the cheapest one up.
+    - "hungarian": same cost matrix, optimal assignment minimising the total distance (requires scipy).
     """
 
-    def __init__(self, model):
+    def __init__(self, model, dispatch_mode="sequential"):
         self.model = model
+        self.dispatch_mode = dispatch_mode
 
     def collect_unsafe_citizens(self):
-        """Return list of citizens that are critically unsafe."""
-        return [
-            a for a in self.model.agents
-            if isinstance(a, CitizenAgent) and a.state == CitizenState.CRITICALLY_UNSAFE
-        ]
+        """Return list of citizens that are critically unsafe (in creation order, from the AgentStore state index)."""
+        store = self.model.agent_store
+        slots = store.in_state(CITIZEN, CitizenState.CRITICALLY_UNSAFE.value)
+        return [store.agents[slot] for slot in sorted(slots)]
+
+    def collect_rescuers(self):
+        return list(self.model.agents_by_type.get(RescueAgent, []))
 
     def assign_rescue_tasks(self):
+        if self.dispatch_mode == "sequential":
+            self.assign_sequential()
+        elif self.dispatch_mode in ("greedy", "hungarian"):
+            self.assign_batched()
+        else:
+            raise ValueError(f"Unknown dispatch mode: {self.dispatch_mode!r}")
+
+    def assign_sequential(self):
         citizens = self.collect_unsafe_citizens()
-        rescuers = [
-            a for a in self.model.agents
-            if isinstance(a, RescueAgent)
-        ]
+        rescuers = self.collect_rescuers()
 
         for citizen in citizens:
             # Skip if any rescuer already heading toward this citizen
@@ -42,22 +60,82 @@ class CallCenterAgent:
             if not available:
                 continue
 
-            # Choose the closest rescuer
-            try:
-                closest = min(
-                    available,
-                    key=lambda r: nx.shortest_path_length(
-                        self.model.space.G,
-                        r.current_edge[0],
-                        citizen.current_edge[0],
-                        weight="length",
-                    ),
-                )
-                closest.set_target(citizen)
-                with open(self.model.log_path, "a") as f:
-                    f.write(f"[CallCenter] Assigned RescueAgent {closest.unique_id} -> Citizen {citizen.unique_id}\n")
-            except nx.NetworkXNoPath:
+            # Choose the closest rescuer (one search from the citizen, the road graph is undirected)
+            distances = self.model.routing.distances(citizen.current_edge[0])
+            reachable = [r for r in available if r.current_edge[0] in distances]
+            if not reachable:
                 continue
+            closest = min(reachable, key=lambda r: distances[r.current_edge[0]])
+            self.assign(closest, citizen)
+
+    def assign_batched(self):
+        rescuers = self.collect_rescuers()
+        targeted = {
+            r.target.unique_id for r in rescuers
+            if r.target is not None and r.state in [RescueState.ON_MISSION, RescueState.CARRYING]
+        }
+        citizens = [c for c in self.collect_unsafe_citizens() if c.unique_id not in targeted]
+        available = [r for r in rescuers if r.state == RescueState.AVAILABLE]
+        if not citizens or not available:
+            return
+
+        cost = self.distance_matrix(available, citizens)
+        if self.dispatch_mode == "hungarian":
+            pairs = self.solve_hungarian(cost)
+        else:
+            pairs = self.solve_greedy(cost)
+
+        for i, j in pairs:
+            self.assign(available[i], citizens[j])
+
+    def distance_matrix(self, rescuers, citizens):
+        """
+        Road distance from every rescuer (rows) to every citizen (columns); math.inf if unreachable.
+        Runs one Dijkstra per agent on the smaller side (the road graph is undirected).
+        """
+        routing = self.model.routing
+        rescuer_nodes = [r.current_edge[0] for r in rescuers]
+        citizen_nodes = [c.current_edge[0] for c in citizens]
+        if len(rescuer_nodes) <= len(citizen_nodes):
+            rows = [routing.distances(n) for n in rescuer_nodes]
+            return [[dist.get(n, math.inf) for n in citizen_nodes] for dist in rows]
+        cols = [routing.distances(n) for n in citizen_nodes]
+        return [[dist.get(n, math.inf) for dist in cols] for n in rescuer_nodes]
+
+    @staticmethod
+    def solve_greedy(cost):
+        """Assigns (rescuer, citizen) pairs from the cheapest one up, each side used at most once."""
+        candidates = sorted(
+            (d, i, j) for i, row in enumerate(cost) for j, d in enumerate(row) if d < math.inf
+        )
+        used_rows, used_cols, pairs = set(), set(), []
+        for _, i, j in candidates:
+            if i in used_rows or j in used_cols:
+                continue
+            used_rows.add(i)
+            used_cols.add(j)
+            pairs.append((i, j))
+        return pairs
+
+    @staticmethod
+    def solve_hungarian(cost):
+        """Assignment minimising the total rescuer-citizen distance (unreachable pairs are never chosen)."""
+        from scipy.optimize import linear_sum_assignment
+
+        matrix = np.array(cost, dtype=float)
+        finite = np.isfinite(matrix)
+        if not finite.any():
+            return []
+        # unreachable pairs get a cost larger than any real assignment
+        big = matrix[finite].sum() + 1.0
+        rows, cols = linear_sum_assignment(np.where(finite, matrix, big))
+        return [(i, j) for i, j in zip(rows, cols) if finite[i, j]]
+
+    def assign(self, rescuer, citizen):
+        self.model.profiler.count("assignments")
+        rescuer.set_target(citizen)
+        self.model.events.info("assigned", "[CallCenter] Assigned RescueAgent {rescuer} -> Citizen {citizen}",
+                               rescuer=rescuer.unique_id, citizen=citizen.unique_id)
 
     def step(self):
         """Execute task assignments each model step."""
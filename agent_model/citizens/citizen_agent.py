@@ -1,10 +1,11 @@
-import random
+import bisect
 import mesa
 from enum import Enum
 
 import networkx as nx
 import numpy as np
-import matplotlib.pyplot as plt
+
+from agent_model.agent_store import CITIZEN, NO_NODE, StoreEdge, StoreField
 
 
 class CitizenState(Enum):
@@ -35,6 +36,10 @@ class CitizenDecisionMakingMode(Enum):
     RANDOM = 1
     FOLLOWER = 2
 
+# Default mix of decision modes; a new citizen draws one uniformly from the model's list.
+DEFAULT_DECISION_MODES = [CitizenDecisionMakingMode.RANDOM, CitizenDecisionMakingMode.DIJIKSTRA, CitizenDecisionMakingMode.DIJIKSTRA,
+                          CitizenDecisionMakingMode.FOLLOWER, CitizenDecisionMakingMode.FOLLOWER]
+
 class CitizenAgent(mesa.Agent):
     """
     Agent model representing the citizens during the flood.
@@ -60,21 +65,32 @@ class CitizenAgent(mesa.Agent):
 
         current-speed (float): Current speed of an agent. Current speed cannot exceed maximum speed. When the agent is flooded or surrounded by too many other agents per grid, its speed decreases.
 
+    current_edge, progress, state, max_speed and current_speed are stored in the model's AgentStore
+    (struct-of-arrays); the agent only keeps its slot there.
     """
+    current_edge = StoreEdge()
+    progress = StoreField("progress")
+    state = StoreField("state", CitizenState)
+    max_speed = StoreField("max_speed")
+    current_speed = StoreField("current_speed")
+
     def __init__(self, model, start_node):
         super().__init__(model)
+        self.slot = model.agent_store.add(self, CITIZEN)
         self.current_edge = (start_node, None)  # current edge (start_node -> next_node)
         self.progress = 0.0  # 0 = at start_node, 1 = at next_node
 
         self.state = CitizenState.UNSAFE
-        self.decision_making_mode = random.choice([CitizenDecisionMakingMode.RANDOM, CitizenDecisionMakingMode.DIJIKSTRA, CitizenDecisionMakingMode.DIJIKSTRA,
-                                                   CitizenDecisionMakingMode.FOLLOWER, CitizenDecisionMakingMode.FOLLOWER])
+        self.decision_making_mode = self.random.choice(model.decision_modes)
 
-        self.max_speed = np.random.normal(1.5, 0.3)
+        self.max_speed = self.rng.normal(1.5, 0.3)
         self.current_speed = self.max_speed
 
-        with open(self.model.log_path, "a") as f:
-                    f.write(f'I am an agent {self.unique_id}, hooray location: {self.current_edge} speed: {self.max_speed} mode: {self.decision_making_mode}\n')
+        self.model.events.debug(
+            "citizen_created",
+            "I am an agent {agent}, hooray location: {edge} speed: {speed} mode: {mode}",
+            agent=self.unique_id, edge=self.current_edge, speed=self.max_speed, mode=self.decision_making_mode,
+        )
 
     def update_state(self, water_matrix: np.ndarray):
         pass
@@ -87,12 +103,14 @@ class CitizenAgent(mesa.Agent):
             return
         if self.current_edge[0] in self.model.safety_spot:
             self.state = CitizenState.RESCUED
+            self.model.routing.release_forecast_routes([self])
             return
         if self.current_edge[1] is None:
             self.choose_destination()
         water_depth = self.model.space.G.nodes[self.current_edge[0]].get("depth", 0)
         if water_depth > 0.5:
             self.state = CitizenState.CRITICALLY_UNSAFE
+            self.model.routing.release_forecast_routes([self])
             return
         else:
             self.current_speed = self.max_speed * np.exp(-2 * water_depth)
@@ -118,50 +136,135 @@ class CitizenAgent(mesa.Agent):
 
         :param current_node: The node the agent is currently at.
         """
-        next_node = random.choice(list(self.model.space.get_neighborhood(current_node)))
+        next_node = self.random.choice(self.model.graph.neighbor_ids(current_node))
         self.current_edge = (current_node, next_node)
         self.progress = 0.0
 
     def dijikstra_path_choice(self, current_node):
         """
-        Runs a dijikstra algorithm to determinate the closest located safety spot and sets is as next_node in self.current_edge
+        Looks up the next node on the shortest path to the closest located safety spot and sets it as next_node
+        in self.current_edge. The distance field is shared by all citizens (model.routing).
+        In forecast routing mode the next node is taken from the citizen's earliest-arrival path instead,
+        which avoids roads flooding before the citizen gets off them.
         If there are no reachable_targets, assigns self.decision_making_mode to RANDOM.
 
         :param current_node: The node the agent is currently at.
         """
-        safety_spots = self.model.safety_spot
-        dist, paths = nx.single_source_dijkstra(self.model.space.G, current_node, weight="length")
-        reachable_targets = [(s, dist[s], paths[s]) for s in safety_spots if s in dist]
+        if self.model.routing_mode == "forecast":
+            next_node = self.model.routing.next_hop_forecast(self, current_node)
+        else:
+            next_node = self.model.routing.next_hop_to_safety(current_node)
 
-        if not reachable_targets:
+        if next_node is None:
             self.decision_making_mode = CitizenDecisionMakingMode.RANDOM
             # self.decision_making_mode = CitizenDecisionMakingMode.FOLLOWER
         else:
-            _, _, path = min(reachable_targets, key=lambda x: x[1])
-            self.current_edge = (current_node, path[1])
+            self.current_edge = (current_node, next_node)
     
     def follower_path_choice(self, current_node):
         """
         Copies the end node of any agent found on the same edge.
         If there're none agents with the same start node, picks path at random.
         """
-        for agent in self.model.agents:
-            if agent.current_edge[0] == current_node:
-                self.current_edge = (current_node, agent.current_edge[1])
-                break
+        # First agent (in creation order) standing at the same start node, from the AgentStore node index
+        store = self.model.agent_store
+        same_node = store.at_node(self.model.node_index[current_node])
+        if same_node:
+            self.current_edge = (current_node, store.get_edge(min(same_node))[1])
         if self.current_edge[1] is None:
-            neighbors = list(self.model.space.G.neighbors(current_node))
-            self.current_edge = (current_node, random.choice(neighbors))
+            self.current_edge = (current_node, self.random.choice(self.model.graph.neighbor_ids(current_node)))
 
     def evacuate(self):
         """
         Calculates progress of the agent on the current path, moves the agent and updates current_edge.
         """
-        edge_length = self.model.space.G[self.current_edge[0]][self.current_edge[1]]['length']
-        self.progress += self.current_speed / edge_length
+        edge_id = self.model.agent_store.edge_id[self.slot]
+        if edge_id == NO_NODE:
+            # no next node chosen (no reachable safe node) - stays at the node, as in step_batch
+            return
+        self.progress += self.current_speed / self.model.edge_length[edge_id]
 
         if self.progress >= 1.0:
             # Dotarł do następnego węzła
             self.current_edge = (self.current_edge[1], None)
             self.progress = 0.0
             self.model.space.move_agent(self, self.current_edge[0])
+            self.model.profiler.count("agents_moved")
+
+    @staticmethod
+    def step_batch(model):
+        """
+        Vectorized equivalent of calling step() on every citizen in creation order, working directly on the
+        AgentStore arrays: the trajectories (and random draws) are the same as with sequential stepping.
+        Decisions at nodes (choose_destination) still run per agent, in creation order; safety checks, speed
+        update and movement along the edges are done for many walking citizens at once.
+
+        Only FOLLOWER decisions look at other citizens (those at the same node). If a citizen before the
+        follower, not moved yet in this step, has its edge starting or ending at that node, the citizens
+        before the follower are moved first, as they would have been in sequential stepping.
+        """
+        store = model.agent_store
+        slots = store.slots(CITIZEN)
+        state = store.state[slots]
+        slots = slots[(state != CitizenState.CRITICALLY_UNSAFE.value) & (state != CitizenState.RESCUED.value)]
+
+        # Reached a safety spot
+        spots = np.array([model.node_index[n] for n in model.safety_spot], dtype=np.intp)
+        at_spot = np.isin(store.edge_start[slots], spots)
+        store.set_state(slots[at_spot], CitizenState.RESCUED.value)
+        model.routing.release_forecast_routes(store.agents[slot] for slot in slots[at_spot])
+        slots = slots[~at_spot]
+
+        deciding = np.flatnonzero(store.edge_end[slots] == NO_NODE).tolist()
+        follower_nodes = {int(store.edge_start[slots[p]]) for p in deciding
+                          if store.agents[slots[p]].decision_making_mode == CitizenDecisionMakingMode.FOLLOWER}
+        # follower node -> positions (in `slots`, ascending) of the citizens whose edge starts or ends there
+        touching = {}
+        if follower_nodes:
+            nodes = np.array(sorted(follower_nodes))
+            for end in (store.edge_start, store.edge_end):
+                for p in np.flatnonzero(np.isin(end[slots], nodes)).tolist():
+                    touching.setdefault(int(end[slots[p]]), []).append(p)
+            for positions in touching.values():
+                positions.sort()
+
+        # Choosing the next node stays per agent
+        start = 0
+        for p in deciding:
+            agent = store.agents[slots[p]]
+            node = int(store.edge_start[slots[p]])
+            if node in follower_nodes and agent.decision_making_mode == CitizenDecisionMakingMode.FOLLOWER:
+                positions = touching.get(node, [])
+                before = bisect.bisect_left(positions, p)
+                if before and positions[before - 1] >= start:
+                    CitizenAgent.move_batch(model, slots[start:p])
+                    start = p
+            agent.choose_destination()
+            end = int(store.edge_end[slots[p]])
+            if end in follower_nodes:
+                bisect.insort(touching.setdefault(end, []), p)
+        CitizenAgent.move_batch(model, slots[start:])
+
+    @staticmethod
+    def move_batch(model, slots):
+        """Safety check, speed update and movement of the walking citizens in `slots` (after their decisions)."""
+        store = model.agent_store
+        water_depth = model.node_depth[store.edge_start[slots]]
+        flooded = water_depth > 0.5
+        store.set_state(slots[flooded], CitizenState.CRITICALLY_UNSAFE.value)
+        model.routing.release_forecast_routes(store.agents[slot] for slot in slots[flooded])
+        slots, water_depth = slots[~flooded], water_depth[~flooded]
+
+        speed = np.maximum(store.max_speed[slots] * np.exp(-2 * water_depth), 0.5)
+        store.current_speed[slots] = speed
+
+        # Move along the current edges
+        moving = store.edge_id[slots] != NO_NODE
+        slots, speed = slots[moving], speed[moving]
+        store.progress[slots] += speed / model.edge_length[store.edge_id[slots]]
+
+        arrived = slots[store.progress[slots] >= 1.0]
+        store.arrive(arrived)
+        model.profiler.count("agents_moved", len(arrived))
+        for slot in arrived:
+            model.space.move_agent(store.agents[slot], model.node_ids[store.edge_start[slot]])
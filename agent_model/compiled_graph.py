@@ -0,0 +1,143 @@
+import heapq
+from itertools import count
+
+import networkx as nx
+import numpy as np
+
+
+class CompiledGraph:
+    """
+    Compact, read-only form of the road graph for the per-step simulation.
+
+    Built once from the networkx graph (which stays the source of truth for I/O):
+    nodes are renumbered 0..n-1 (node_ids[i] is the original label), adjacency is stored
+    in CSR form (neighbours of node i are indices[indptr[i]:indptr[i + 1]], the matching
+    edge ids in adj_edge), plus edge lengths, node coordinates and raster positions.
+    Neighbour order follows the networkx adjacency, so random choices and Dijkstra
+    tie-breaking give the same results as the networkx functions they replace.
+
+    Shortest-path primitives take node indices and an optional per-edge boolean mask
+    (e.g. only safe edges) instead of building subgraphs.
+    """
+
+    def __init__(self, G, weight="length"):
+        self.node_ids = list(G.nodes)
+        self.node_index = {n: i for i, n in enumerate(self.node_ids)}
+        n_nodes = len(self.node_ids)
+
+        pos = [G.nodes[n].get('pos') or (G.nodes[n].get('x', 0.0), G.nodes[n].get('y', 0.0)) for n in self.node_ids]
+        self.node_x = np.array([float(p[0]) for p in pos])
+        self.node_y = np.array([float(p[1]) for p in pos])
+        pos_array = [G.nodes[n].get('pos_array', (0, 0)) for n in self.node_ids]
+        self.node_cols = np.array([p[0] for p in pos_array], dtype=np.intp)
+        self.node_rows = np.array([p[1] for p in pos_array], dtype=np.intp)
+
+        self.edge_list = list(G.edges)
+        self.edge_u = np.array([self.node_index[u] for u, _ in self.edge_list], dtype=np.intp)
+        self.edge_v = np.array([self.node_index[v] for _, v in self.edge_list], dtype=np.intp)
+        self.edge_length = np.array([G.edges[e].get(weight, 1) for e in self.edge_list], dtype=float)
+        # (node index, node index) -> edge index, both directions
+        self.edge_ids = {}
+        for i, (u, v) in enumerate(zip(self.edge_u.tolist(), self.edge_v.tolist())):
+            self.edge_ids[(u, v)] = i
+            self.edge_ids[(v, u)] = i
+
+        indptr = [0]
+        indices = []
+        adj_edge = []
+        for u, n in enumerate(self.node_ids):
+            for nbr in G.adj[n]:
+                v = self.node_index[nbr]
+                indices.append(v)
+                adj_edge.append(self.edge_ids[(u, v)])
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.intp)
+        self.indices = np.array(indices, dtype=np.intp)
+        self.adj_edge = np.array(adj_edge, dtype=np.intp)
+
+        # plain-list copies for the Python search loops (list indexing is much faster than ndarray indexing)
+        self._adjacency = [
+            list(zip(indices[indptr[u]:indptr[u + 1]], adj_edge[indptr[u]:indptr[u + 1]]))
+            for u in range(n_nodes)
+        ]
+        self._neighbor_ids = [[self.node_ids[v] for v, _ in adj] for adj in self._adjacency]
+        self._edge_length = self.edge_length.tolist()
+
+    @property
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def neighbors(self, u):
+        """Neighbour node indices of node index `u`."""
+        return self.indices[self.indptr[u]:self.indptr[u + 1]]
+
+    def neighbor_ids(self, node):
+        """Neighbour labels of the node labelled `node`, in networkx adjacency order."""
+        return self._neighbor_ids[self.node_index[node]]
+
+    def edge_id(self, u, v):
+        """Edge index between node labels `u` and `v`."""
+        return self.edge_ids[(self.node_index[u], self.node_index[v])]
+
+    def length(self, u, v):
+        """Length of the edge between node labels `u` and `v`."""
+        return self._edge_length[self.edge_id(u, v)]
+
+    def dijkstra(self, sources, target=None, edge_mask=None):
+        """
+        Dijkstra from node indices `sources` over edges allowed by `edge_mask` (all edges if None).
+        Stops early when `target` is settled. Returns (dist, pred) dicts keyed by node index.
+        Mirrors networkx's _dijkstra_multisource so ties are broken the same way.
+        """
+        lengths = self._edge_length
+        adjacency = self._adjacency
+        dist = {}
+        seen = {}
+        pred = {}
+        c = count()
+        fringe = []
+        for s in sources:
+            seen[s] = 0.0
+            pred[s] = None
+            heapq.heappush(fringe, (0.0, next(c), s))
+        while fringe:
+            d, _, v = heapq.heappop(fringe)
+            if v in dist:
+                continue
+            dist[v] = d
+            if v == target:
+                break
+            for u, e in adjacency[v]:
+                if edge_mask is not None and not edge_mask[e]:
+                    continue
+                vu_dist = d + lengths[e]
+                if u in dist:
+                    continue
+                if u not in seen or vu_dist < seen[u]:
+                    seen[u] = vu_dist
+                    pred[u] = v
+                    heapq.heappush(fringe, (vu_dist, next(c), u))
+        return dist, pred
+
+    def shortest_path(self, source, target, edge_mask=None):
+        """Shortest path between node indices as a list of node indices; raises nx.NetworkXNoPath."""
+        dist, pred = self.dijkstra([source], target=target, edge_mask=edge_mask)
+        if target not in dist:
+            raise nx.NetworkXNoPath(f"No path between {self.node_ids[source]} and {self.node_ids[target]}.")
+        path = [target]
+        while pred[path[-1]] is not None:
+            path.append(pred[path[-1]])
+        path.reverse()
+        return path
+
+    def distance(self, source, target, edge_mask=None):
+        """Shortest path length between node indices; raises nx.NetworkXNoPath."""
+        dist, _ = self.dijkstra([source], target=target, edge_mask=edge_mask)
+        if target not in dist:
+            raise nx.NetworkXNoPath(f"No path between {self.node_ids[source]} and {self.node_ids[target]}.")
+        return dist[target]
+
+    def distances(self, source, edge_mask=None):
+        """Shortest path lengths from node index `source` to every reachable node index."""
+        dist, _ = self.dijkstra([source], edge_mask=edge_mask)
+        return dist
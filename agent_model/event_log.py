@@ -0,0 +1,123 @@
+import os
+import json
+import atexit
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING"}
+
+# text file produced for every stream
+STREAM_FILES = {
+    "log": "log.txt",
+    "time": "evac_time.txt",
+}
+
+
+class EventLog:
+    """
+    Model-level event sink replacing open-append-close for every log line.
+
+    Events are kept in an in-memory buffer and written in batches (every `flush_every`
+    events, on flush() / close() and at interpreter exit). Each event has a level, a
+    stream ("log" -> log.txt, "time" -> evac_time.txt), an event name, structured fields
+    and a message template that is only formatted when the event is written, so events
+    below the active level cost a single comparison.
+
+    Output formats:
+    - "text": the classic log.txt / evac_time.txt files,
+    - "jsonl": one JSON object per event in events.jsonl with keys step, level, stream, event,
+      fields (the structured fields) and text (write_text_logs rebuilds the text files),
+    - "both": all of the above.
+    """
+
+    def __init__(self, folder, model=None, level=DEBUG, output="text", flush_every=1000):
+        self.folder = folder
+        self.model = model
+        self.level = level
+        self.output = output
+        self.flush_every = flush_every
+        self.buffer = []
+        self.closed = False
+        atexit.register(self.close)
+
+    def enabled(self, level):
+        """Use to skip building expensive event fields for disabled levels."""
+        return level >= self.level
+
+    def log(self, level, event, message, stream="log", **fields):
+        if level < self.level:
+            return
+        step = self.model.count if self.model is not None else None
+        self.buffer.append((step, level, stream, event, message, fields))
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def debug(self, event, message, stream="log", **fields):
+        self.log(DEBUG, event, message, stream, **fields)
+
+    def info(self, event, message, stream="log", **fields):
+        self.log(INFO, event, message, stream, **fields)
+
+    def warning(self, event, message, stream="log", **fields):
+        self.log(WARNING, event, message, stream, **fields)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        buffer, self.buffer = self.buffer, []
+
+        # time and file writes are reported to the model's StepProfiler, if there is one
+        profiler = getattr(self.model, "profiler", None)
+        if profiler is not None:
+            with profiler.phase("logging"):
+                profiler.count("file_writes", self._write(buffer))
+        else:
+            self._write(buffer)
+
+    def _write(self, buffer):
+        """Writes the buffered events; returns the number of files written."""
+        writes = 0
+
+        if self.output in ("text", "both"):
+            lines = {stream: [] for stream in STREAM_FILES}
+            for _, _, stream, _, message, fields in buffer:
+                lines[stream].append(message.format(**fields) + "\n")
+            for stream, stream_lines in lines.items():
+                if stream_lines:
+                    with open(os.path.join(self.folder, STREAM_FILES[stream]), "a") as f:
+                        f.writelines(stream_lines)
+                    writes += 1
+
+        if self.output in ("jsonl", "both"):
+            with open(os.path.join(self.folder, "events.jsonl"), "a") as f:
+                for step, level, stream, event, message, fields in buffer:
+                    # fields nested, so names like "step" or "level" cannot overwrite the record keys
+                    record = {"step": step, "level": LEVEL_NAMES.get(level, level), "stream": stream,
+                              "event": event, "fields": fields, "text": message.format(**fields)}
+                    f.write(json.dumps(record, default=str) + "\n")
+            writes += 1
+        return writes
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        atexit.unregister(self.close)
+
+
+def write_text_logs(jsonl_path, folder, level=DEBUG):
+    """Rebuilds log.txt / evac_time.txt in `folder` from an events.jsonl file."""
+    levels = {name: value for value, name in LEVEL_NAMES.items()}
+    files = {stream: open(os.path.join(folder, name), "w") for stream, name in STREAM_FILES.items()}
+    try:
+        with open(jsonl_path) as f:
+            for line in f:
+                record = json.loads(line)
+                if levels.get(record["level"], record["level"]) >= level:
+                    files[record["stream"]].write(record["text"] + "\n")
+    finally:
+        for f in files.values():
+            f.close()
@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+
+
+class FloodForecast:
+    """
+    When every road will flood, derived once from the model's saved water frames.
+
+    The model maps frame `step` onto the roads at every flood update (steps that are
+    multiples of flood_interval; after the last frame the last one stays). The depth of
+    every edge is computed for each of these updates exactly as in TestModel.flood_step,
+    giving an (updates x edges) table of unsafe flags. closing_steps(step) turns it into
+    the step at which each edge is (first) marked unsafe at or after `step`: an edge that
+    floods at update step c cannot be driven during step c or later. Edges that are
+    unsafe already close at the current update step; edges that never flood close at inf.
+
+    Only available when the model replays saved frames (not in coupled hydrology mode).
+    """
+
+    def __init__(self, model):
+        if model.water_maps is None:
+            raise ValueError("Flood forecast needs saved water frames (TestModel without hydrology)")
+        self.interval = model.flood_interval
+        n_frames = len(model.water_maps)
+        # update steps up to the first one showing the last frame, which then stays forever
+        self.update_steps = np.arange(0, n_frames + self.interval, self.interval)
+        self.update_steps = self.update_steps[:np.searchsorted(self.update_steps, n_frames - 1) + 1]
+        self.unsafe = np.array([
+            model.compute_edge_depth(model.water_maps[min(int(step), n_frames - 1)]) > model.safe_depth
+            for step in self.update_steps
+        ])
+        self._closing = None
+        self._closing_index = None
+
+    def update_index(self, step):
+        """Row of the flood update in force at `step` (the last one at or before it)."""
+        return min(int(step) // self.interval, len(self.update_steps) - 1)
+
+    def closing_steps(self, step):
+        """
+        Per-edge list: step from which the edge is unsafe, for travel starting at `step` or
+        later (math.inf if it never floods). Cached until the next flood update.
+        """
+        i = self.update_index(step)
+        if self._closing_index != i:
+            ahead = self.unsafe[i:]
+            first = ahead.argmax(axis=0)
+            # edges unsafe now close at the current update step, before any departure
+            closing = self.update_steps[i + first].astype(float)
+            closing[~ahead.any(axis=0)] = math.inf
+            self._closing = closing.tolist()
+            self._closing_index = i
+        return self._closing
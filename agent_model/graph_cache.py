@@ -0,0 +1,176 @@
+import os
+import json
+import hashlib
+from collections import deque
+
+import networkx as nx
+import numpy as np
+
+CACHE_VERSION = 1
+
+
+def cache_path_for(graphml_path):
+    """Default location of the binary cache: next to the GraphML file (roads.graphml -> roads.graph.npz)."""
+    root, _ = os.path.splitext(graphml_path)
+    return root + ".graph.npz"
+
+
+def file_hash(path):
+    """SHA-256 of the file contents, used as the cache key."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_graph(graphml_path, cache_path=None):
+    """
+    Road graph from `graphml_path` with nodes relabelled to integers, as
+    nx.convert_node_labels_to_integers(nx.read_graphml(path)) would return it.
+
+    Loaded from the binary cache when its content hash matches the GraphML file;
+    otherwise the GraphML is parsed and the cache is (re)written.
+    """
+    cache_path = cache_path or cache_path_for(graphml_path)
+    key = file_hash(graphml_path)
+    G = load_graph_cache(cache_path, key)
+    if G is None:
+        G = nx.convert_node_labels_to_integers(nx.read_graphml(graphml_path))
+        save_graph_cache(G, cache_path, key)
+    return G
+
+
+def update_graph_cache(graphml_path, cache_path=None):
+    """Parses `graphml_path` and writes its binary cache (used right after writing the GraphML)."""
+    cache_path = cache_path or cache_path_for(graphml_path)
+    G = nx.convert_node_labels_to_integers(nx.read_graphml(graphml_path))
+    save_graph_cache(G, cache_path, file_hash(graphml_path))
+    return cache_path
+
+
+def save_graph_cache(G, cache_path, key):
+    """
+    Writes an undirected graph with integer nodes 0..n-1 as a NumPy archive: edges as
+    index arrays, one array per node / edge attribute (plus a presence mask for
+    attributes missing on some items) and the graph attributes as JSON.
+    Edges are stored in an order that reproduces the networkx adjacency order on load,
+    so neighbour iteration (and everything seeded on it) is the same as for the GraphML.
+    """
+    nodes = list(G.nodes)
+    if nodes != list(range(len(nodes))):
+        raise ValueError("Graph cache expects nodes labelled 0..n-1 (use nx.convert_node_labels_to_integers)")
+    edges = adjacency_edge_order(G)
+
+    arrays = {
+        "version": np.array(CACHE_VERSION),
+        "key": np.array(key),
+        "graph": np.array(json.dumps(G.graph)),
+        "n_nodes": np.array(len(nodes)),
+        "edge_u": np.array([u for u, _ in edges], dtype=np.int64),
+        "edge_v": np.array([v for _, v in edges], dtype=np.int64),
+    }
+    arrays.update(attribute_arrays("node", [G.nodes[n] for n in nodes]))
+    arrays.update(attribute_arrays("edge", [G.edges[e] for e in edges]))
+
+    tmp_path = cache_path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+def load_graph_cache(cache_path, key=None):
+    """Graph stored in `cache_path`, or None if the file is missing, stale (different key) or of another version."""
+    if not os.path.exists(cache_path):
+        return None
+    with np.load(cache_path) as data:
+        if int(data["version"]) != CACHE_VERSION or (key is not None and str(data["key"]) != key):
+            return None
+        n_nodes = int(data["n_nodes"])
+        edge_u = data["edge_u"].tolist()
+        edge_v = data["edge_v"].tolist()
+        node_attrs = read_attribute_arrays("node", data, n_nodes)
+        edge_attrs = read_attribute_arrays("edge", data, len(edge_u))
+        graph_attrs = json.loads(str(data["graph"]))
+
+    G = nx.Graph()
+    G.graph.update(graph_attrs)
+    G.add_nodes_from(zip(range(n_nodes), node_attrs))
+    G.add_edges_from(zip(edge_u, edge_v, edge_attrs))
+    return G
+
+
+def adjacency_edge_order(G):
+    """
+    Order of edges such that adding them one by one to a graph with the same nodes gives
+    every node the same neighbour order as in G. Each node's adjacency fixes the relative
+    order of its edges; these chains are merged with a topological sort.
+    """
+    edge_of = {}
+    edges = []
+    chains = []
+    for u in G:
+        chain = []
+        for v in G.adj[u]:
+            key = (u, v) if (v, u) not in edge_of else (v, u)
+            if key not in edge_of:
+                edge_of[key] = len(edges)
+                edges.append(key)
+            chain.append(edge_of[key])
+        chains.append(chain)
+
+    successors = [[] for _ in edges]
+    indegree = [0] * len(edges)
+    for chain in chains:
+        for a, b in zip(chain, chain[1:]):
+            successors[a].append(b)
+            indegree[b] += 1
+
+    queue = deque(i for i, d in enumerate(indegree) if d == 0)
+    order = []
+    while queue:
+        i = queue.popleft()
+        order.append(edges[i])
+        for j in successors[i]:
+            indegree[j] -= 1
+            if indegree[j] == 0:
+                queue.append(j)
+    if len(order) != len(edges):
+        raise ValueError("Adjacency order cannot be reproduced by edge insertion")
+    return order
+
+
+def attribute_arrays(prefix, dicts):
+    """One array per attribute name (`<prefix>.<name>`), plus `<prefix>_present.<name>` masks where some items lack it."""
+    names = []
+    for d in dicts:
+        for name in d:
+            if name not in names:
+                names.append(name)
+
+    arrays = {}
+    for name in names:
+        present = np.array([name in d for d in dicts], dtype=bool)
+        default = next(type(d[name])() for d in dicts if name in d)
+        arrays[f"{prefix}.{name}"] = np.array([d.get(name, default) for d in dicts])
+        if not present.all():
+            arrays[f"{prefix}_present.{name}"] = present
+    return arrays
+
+
+def read_attribute_arrays(prefix, data, n_items):
+    """Inverse of attribute_arrays: list of attribute dicts (Python scalars) in item order."""
+    columns = {}
+    for field in data.files:
+        if field.startswith(prefix + "."):
+            name = field[len(prefix) + 1:]
+            values = data[field].tolist()
+            mask_field = f"{prefix}_present.{name}"
+            present = data[mask_field].tolist() if mask_field in data.files else None
+            columns[name] = (values, present)
+
+    dicts = [{} for _ in range(n_items)]
+    for name, (values, present) in columns.items():
+        for i, value in enumerate(values):
+            if present is None or present[i]:
+                dicts[i][name] = value
+    return dicts
@@ -0,0 +1,149 @@
+import csv
+from collections import Counter, defaultdict
+from time import perf_counter
+
+
+class _Phase:
+    """Reusable context manager timing one named phase of a StepProfiler."""
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._push(self.name)
+
+    def __exit__(self, *exc):
+        self.profiler._pop()
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_PHASE = _NullPhase()
+
+
+class StepProfiler:
+    """
+    Per-step wall time of the phases of TestModel.step plus event counters.
+
+    Phases are timed with `with profiler.phase(name): ...` and are exclusive: a phase
+    started inside another one (e.g. "logging" when an agent fills the event buffer)
+    pauses the outer phase, so the phase times of a step add up to its total.
+    Time of the step not covered by any phase is reported as "other". Counters are
+    incremented with `profiler.count(name, n)`.
+
+    Only activity between begin_step() and end_step() is recorded; every step becomes
+    one row of `rows` (step, total, phase seconds, counters). When disabled, phase()
+    returns a shared no-op context manager and count() returns immediately, so the
+    instrumentation left in the hot paths costs one method call.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.rows = []
+        self._phases = {}
+        self._stack = []
+        self._resumed = 0.0
+        self._step = None
+        self._step_start = 0.0
+        self._times = defaultdict(float)
+        self._counts = Counter()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = _Phase(self, name)
+        return phase
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self._counts[name] += n
+
+    def _push(self, name):
+        now = perf_counter()
+        if self._stack:
+            self._times[self._stack[-1]] += now - self._resumed
+        self._stack.append(name)
+        self._resumed = now
+
+    def _pop(self):
+        now = perf_counter()
+        self._times[self._stack.pop()] += now - self._resumed
+        self._resumed = now
+
+    def begin_step(self, step):
+        if not self.enabled:
+            return
+        self._step = step
+        self._times = defaultdict(float)
+        self._counts = Counter()
+        self._step_start = perf_counter()
+
+    def end_step(self):
+        if not self.enabled or self._step is None:
+            return
+        total = perf_counter() - self._step_start
+        times = dict(self._times)
+        times["other"] = max(total - sum(times.values()), 0.0)
+        self.rows.append({"step": self._step, "total": total, "times": times, "counts": dict(self._counts)})
+        self._step = None
+
+    def phase_names(self):
+        names = sorted({name for row in self.rows for name in row["times"]} - {"other"})
+        return names + ["other"] if self.rows else names
+
+    def counter_names(self):
+        return sorted({name for row in self.rows for name in row["counts"]})
+
+    def summary(self):
+        """
+        {"steps": n, "total": seconds, "phases": {name: {"total", "mean", "max", "share"}},
+        "counters": {name: {"total", "mean", "max"}}} over all recorded steps (times in seconds).
+        """
+        n = len(self.rows)
+        total = sum(row["total"] for row in self.rows)
+        phases = {}
+        for name in self.phase_names():
+            values = [row["times"].get(name, 0.0) for row in self.rows]
+            phases[name] = {"total": sum(values), "mean": sum(values) / n, "max": max(values),
+                            "share": sum(values) / total if total else 0.0}
+        counters = {}
+        for name in self.counter_names():
+            values = [row["counts"].get(name, 0) for row in self.rows]
+            counters[name] = {"total": sum(values), "mean": sum(values) / n, "max": max(values)}
+        return {"steps": n, "total": total, "phases": phases, "counters": counters}
+
+    def table(self):
+        """Text table of the summary: phases by total time, then counters."""
+        summary = self.summary()
+        lines = [f"{summary['steps']} steps, {summary['total']:.3f} s",
+                 f"{'phase':<28} {'total s':>10} {'mean ms':>10} {'max ms':>10} {'share':>7}"]
+        for name, p in sorted(summary["phases"].items(), key=lambda item: -item[1]["total"]):
+            lines.append(f"{name:<28} {p['total']:>10.4f} {p['mean'] * 1000:>10.3f} {p['max'] * 1000:>10.3f} "
+                         f"{p['share']:>7.1%}")
+        if summary["counters"]:
+            lines.append(f"{'counter':<28} {'total':>10} {'mean':>10} {'max':>10}")
+            for name, c in summary["counters"].items():
+                lines.append(f"{name:<28} {c['total']:>10} {c['mean']:>10.2f} {c['max']:>10}")
+        return "\n".join(lines)
+
+    def write_csv(self, path):
+        """One row per step: step, total and phase times [s], counters."""
+        phases, counters = self.phase_names(), self.counter_names()
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["step", "total"] + phases + counters)
+            for row in self.rows:
+                writer.writerow([row["step"], row["total"]] + [row["times"].get(name, 0.0) for name in phases]
+                                + [row["counts"].get(name, 0) for name in counters])
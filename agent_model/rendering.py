@@ -0,0 +1,125 @@
+import queue
+import multiprocessing
+
+import numpy as np
+
+"""
+Rendering of the evacuation model, decoupled from the simulation.
+
+The model only builds cheap snapshots (agent positions, edge safety, current water frame);
+matplotlib is imported lazily by the renderer itself, so a headless run never imports it.
+The renderer keeps persistent artists (terrain/water images, a LineCollection for the roads,
+scatter plots for agents) and only updates their data instead of redrawing the whole figure.
+"""
+
+
+def agent_positions(model, agents):
+    """Raster (x, y) position of every agent, interpolated along its current edge."""
+    if not agents:
+        return np.empty((0, 2))
+    index = model.node_index
+    start = np.array([index[a.current_edge[0]] for a in agents])
+    end = np.array([index[a.current_edge[1]] if a.current_edge[1] is not None else index[a.current_edge[0]]
+                    for a in agents])
+    progress = np.array([a.progress if a.current_edge[1] is not None else 0.0 for a in agents])
+    x0, y0 = model.node_cols[start], model.node_rows[start]
+    x1, y1 = model.node_cols[end], model.node_rows[end]
+    return np.column_stack((x0 + (x1 - x0) * progress, y0 + (y1 - y0) * progress))
+
+
+def snapshot(model, citizen_type, rescuer_type):
+    """Everything the renderer needs for one frame, as plain arrays (picklable)."""
+    return {
+        "step": model.count,
+        "water": np.asarray(model.water),
+        "edge_safe": model.edge_safe.copy(),
+        "citizens": agent_positions(model, list(model.agents_by_type.get(citizen_type, []))),
+        "rescuers": agent_positions(model, list(model.agents_by_type.get(rescuer_type, []))),
+    }
+
+
+def static_scene(model):
+    """Data that does not change during a run: terrain, road segments and safety spots."""
+    segments = np.stack((
+        np.column_stack((model.node_cols[model.edge_u], model.node_rows[model.edge_u])),
+        np.column_stack((model.node_cols[model.edge_v], model.node_rows[model.edge_v])),
+    ), axis=1)
+    spots = [model.node_index[n] for n in model.safety_spot]
+    return {
+        "height": model.height,
+        "segments": segments,
+        "safety_spots": np.column_stack((model.node_cols[spots], model.node_rows[spots])),
+    }
+
+
+class Renderer:
+    """Matplotlib view of the model that updates persistent artists in place."""
+
+    def __init__(self, scene, pause=0.2):
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+
+        self.plt = plt
+        self.pause = pause
+        plt.ion()
+        self.fig, self.ax = plt.subplots(figsize=(10, 10))
+        ax = self.ax
+
+        ax.imshow(scene["height"], cmap='terrain', origin='upper')
+        self.water_image = ax.imshow(np.zeros_like(scene["height"], dtype=float), cmap='Blues', alpha=0.6,
+                                     origin='upper', vmin=0, vmax=1)
+        self.roads = LineCollection(scene["segments"], colors='black', linewidths=2, label='Roads (red = unsafe)')
+        ax.add_collection(self.roads)
+        ax.scatter(scene["safety_spots"][:, 0], scene["safety_spots"][:, 1], s=100, c='green',
+                   label='Safe Nodes', zorder=3)
+        self.citizens = ax.scatter([], [], c='blue', s=20, label='Agents', zorder=2)
+        self.rescuers = ax.scatter([], [], c='purple', s=20, label='Rescue Agents', zorder=2)
+        ax.legend()
+        self.title = ax.set_title("Road network with agents")
+
+    def draw(self, snap):
+        water = snap["water"]
+        self.water_image.set_data(water)
+        self.water_image.set_clim(0, max(float(np.max(water)) / 3, 1e-6))
+        self.roads.set_color(np.where(snap["edge_safe"][:, None], (0, 0, 0, 1), (1, 0, 0, 1)))
+        self.citizens.set_offsets(snap["citizens"])
+        self.rescuers.set_offsets(snap["rescuers"])
+        self.title.set_text(f"Road network with agents - step {snap['step']}")
+        self.fig.canvas.draw_idle()
+        self.plt.pause(self.pause)
+
+    def close(self):
+        self.plt.close(self.fig)
+
+
+def render_loop(scene, snapshots, pause):
+    """Body of the renderer process: draw snapshots until a None sentinel arrives."""
+    renderer = Renderer(scene, pause=pause)
+    while True:
+        snap = snapshots.get()
+        if snap is None:
+            break
+        renderer.draw(snap)
+    renderer.close()
+
+
+class ProcessRenderer:
+    """
+    Runs a Renderer in a separate process. Snapshots are passed through a small queue;
+    when the renderer falls behind, new snapshots are dropped instead of blocking the model.
+    """
+
+    def __init__(self, scene, pause=0.2, max_pending=2):
+        self.snapshots = multiprocessing.Queue(maxsize=max_pending)
+        self.process = multiprocessing.Process(target=render_loop, args=(scene, self.snapshots, pause), daemon=True)
+        self.process.start()
+
+    def draw(self, snap):
+        try:
+            self.snapshots.put_nowait(snap)
+        except queue.Full:
+            pass
+
+    def close(self):
+        self.snapshots.put(None)
+        self.process.join(timeout=5)
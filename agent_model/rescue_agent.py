@@ -2,6 +2,7 @@ import mesa
 import numpy as np
 import networkx as nx
 from agent_model.citizens.citizen_agent import CitizenAgent, CitizenState
+from agent_model.agent_store import RESCUER, StoreEdge, StoreField
 
 
 class RescueState:
@@ -15,13 +16,21 @@ class RescueAgent(mesa.Agent):
     """
     Rescue agent representing emergency services (fire, ambulance).
     Drives along the road network to rescue citizens and deliver them to safety.
+    current_edge, progress, speed and state are stored in the model's AgentStore.
+    Routes are planned through the model's RoutingService, which repairs them
+    (repair_route) when a flood update makes roads ahead of the rescuer unsafe.
     """
+    current_edge = StoreEdge()
+    progress = StoreField("progress")
+    speed = StoreField("max_speed")
+    state = StoreField("state", int)
 
     def __init__(self, model, start_node):
         super().__init__(model)
+        self.slot = model.agent_store.add(self, RESCUER)
         self.current_edge = (start_node, None)
         self.progress = 0.0
-        self.speed = np.random.normal(8.0, 1.0)  # driving only
+        self.speed = self.rng.normal(8.0, 1.0)  # driving only
         self.capacity = 2
         self.carrying = []
         self.target = None
@@ -30,43 +39,58 @@ class RescueAgent(mesa.Agent):
 
         self.rescue_start_times = {}  # citizen_id -> start time
 
-        with open(self.model.log_path, "a") as f:
-                    f.write(f"[RescueAgent {self.unique_id}] Ready at node {start_node}\n")
+        self.model.events.debug("rescuer_created", "[RescueAgent {rescuer}] Ready at node {node}",
+                                rescuer=self.unique_id, node=start_node)
 
     def set_target(self, citizen):
         """Assign a new target (citizen) and compute a path avoiding unsafe roads."""
         self.target = citizen
-        G = self.model.space.G
         if citizen.unique_id not in self.rescue_start_times:
             self.rescue_start_times[citizen.unique_id] = self.model.count
 
-        # Create a subgraph that only includes safe edges
-        safe_edges = [(u, v) for u, v, d in G.edges(data=True) if d.get("safe", "yes") == "yes"]
-        subG = G.edge_subgraph(safe_edges).copy()
-
         try:
-            path = nx.shortest_path(subG, self.current_edge[0], citizen.current_edge[0], weight="length")
+            # Shared safe-road routing (falls back to the full graph if needed), kept for repairs
+            path = self.model.routing.plan_route(self, self.current_edge[0], citizen.current_edge[0])
             self.path = path
             if len(path) > 1:
                 self.current_edge = (self.current_edge[0], path[1])
             self.state = RescueState.ON_MISSION
-            with open(self.model.log_path, "a") as f:
-                    f.write(f"[RescueAgent {self.unique_id}] Safe path to citizen {citizen.unique_id}: {len(path)} steps\n")
+            self.model.events.info("path_found", "[RescueAgent {rescuer}] Safe path to citizen {citizen}: {length} steps",
+                                   rescuer=self.unique_id, citizen=citizen.unique_id, length=len(path))
         except Exception:
-            try:
-                path = nx.shortest_path(G, self.current_edge[0], citizen.current_edge[0], weight="length")
-                self.path = path
-                if len(path) > 1:
-                    self.current_edge = (self.current_edge[0], path[1])
-                self.state = RescueState.ON_MISSION
-                with open(self.model.log_path, "a") as f:
-                    f.write(f"[RescueAgent {self.unique_id}] Safe path to citizen {citizen.unique_id}: {len(path)} steps\n")
-            except Exception:
-                with open(self.model.log_path, "a") as f:
-                    f.write(f"[RescueAgent {self.unique_id}] No path to Citizen {citizen.unique_id}\n")
-                self.path = []
-                self.target = None
-                self.state = RescueState.AVAILABLE
+            self.model.events.warning("no_path", "[RescueAgent {rescuer}] No path to Citizen {citizen}",
+                                      rescuer=self.unique_id, citizen=citizen.unique_id)
+            self.model.routing.release_route(self)
+            self.path = []
+            self.target = None
+            self.state = RescueState.AVAILABLE
+
+    def repair_route(self):
+        """
+        Called by the routing service when roads on the planned route became unsafe. The edge
+        being driven along is kept; if any road after it is unsafe, the rest of the path is
+        replaced by the repaired route from the end of that edge. The old path is kept if the
+        goal cannot be reached at all.
+        """
+        keep = 1 if self.progress > 0 else 0
+        ahead = self.path[keep:]
+        if len(ahead) < 2:
+            return
+        graph = self.model.graph
+        if all(self.model.edge_safe[graph.edge_id(u, v)] for u, v in zip(ahead, ahead[1:])):
+            return
+        try:
+            repaired = self.model.routing.repair_route(self, ahead[0])
+        except nx.NetworkXException:
+            self.model.events.warning("no_path", "[RescueAgent {rescuer}] No path to repair the route",
+                                      rescuer=self.unique_id)
+            return
+        self.path = self.path[:keep] + repaired
+        if self in self.model.routing.routes:
+            self.model.routing.register_path(self, self.path)
+        self.current_edge = (self.path[0], self.path[1] if len(self.path) > 1 else None)
+        self.model.events.info("path_repaired", "[RescueAgent {rescuer}] Route repaired: {length} steps",
+                               rescuer=self.unique_id, length=len(self.path))
 
     def move_along_path(self):
         """Move along the current path according to speed and edge length."""
@@ -74,15 +98,16 @@ class RescueAgent(mesa.Agent):
             return
 
         next_node = self.path[1]
-        G = self.model.space.G
-        edge_length = G[self.path[0]][next_node]["length"]
+        edge_length = self.model.graph.length(self.path[0], next_node)
         self.progress += self.speed / edge_length
 
         if self.progress >= 1.0:
             # Arrived at the next node
             self.current_edge = (next_node, self.path[2] if len(self.path) > 2 else None)
             self.model.space.move_agent(self, next_node)
+            self.model.profiler.count("agents_moved")
             self.path.pop(0)
+            self.model.routing.advance_path(self)
             self.progress = 0.0
 
             for c in self.carrying:
@@ -104,31 +129,33 @@ class RescueAgent(mesa.Agent):
                     self.state = RescueState.CARRYING
                     self.target = None
 
-                    with open(self.model.log_path, "a") as f:
-                        f.write(f"[RescueAgent {self.unique_id}] Rescued Citizen {a.unique_id}\n")
+                    self.model.events.info("rescued", "[RescueAgent {rescuer}] Rescued Citizen {citizen}",
+                                           rescuer=self.unique_id, citizen=a.unique_id)
 
                     start_step = self.rescue_start_times.pop(a.unique_id, self.model.count)
                     evac_time = self.model.count - start_step
-                    with open(self.model.log_path_time, "a") as f:
-                        f.write(f"RESCUED: RescueAgent: {self.unique_id}, Citizen: {a.unique_id}, time: {evac_time} steps [{start_step} - {self.model.count}]\n")
+                    self.model.events.info(
+                        "rescue_time",
+                        "RESCUED: RescueAgent: {rescuer}, Citizen: {citizen}, time: {time} steps [{start} - {end}]",
+                        stream="time", rescuer=self.unique_id, citizen=a.unique_id, time=evac_time,
+                        start=start_step, end=self.model.count,
+                    )
                     self.rescue_start_times[a.unique_id] = self.model.count
 
-                    # Compute route to nearest safe location
-                    safe = min(
-                        self.model.safety_spot,
-                        key=lambda n: nx.shortest_path_length(
-                            self.model.space.G,
-                            self.current_edge[0],
-                            n,
-                            weight="length",
-                        ),
-                    )
-                    safe_edges = [(u, v) for u, v, d in self.model.space.G.edges(data=True) if d.get("safe", "yes") == "yes"]
-                    subG = self.model.space.G.edge_subgraph(safe_edges).copy()
-                    try:
-                        self.path = nx.shortest_path(subG, self.current_edge[0], safe, weight="length")
-                    except Exception:
-                        self.path = nx.shortest_path(self.model.space.G, self.current_edge[0], safe, weight="length")
+                    # Forecast mode: the safety spot reached first without driving into water,
+                    # leaving next step (this step's move is done)
+                    if self.model.routing_mode == "forecast":
+                        found = self.model.routing.forecast_path(self.current_edge[0], self.model.safety_spot,
+                                                                 self.speed, self.model.count + 1)
+                        if found is not None:
+                            self.model.routing.release_route(self)
+                            self.path = found[0]
+                            return
+
+                    # Compute route to nearest safe location (one search for all spots)
+                    distances = self.model.routing.distances(self.current_edge[0])
+                    safe = min(self.model.safety_spot, key=lambda n: distances.get(n, float("inf")))
+                    self.path = self.model.routing.plan_route(self, self.current_edge[0], safe)
 
                     return
 
@@ -137,16 +164,21 @@ class RescueAgent(mesa.Agent):
         # Case 1: carrying citizens → go to safety
         if self.state == RescueState.CARRYING:
             if self.current_edge[0] in self.model.safety_spot:
-                with open(self.model.log_path, "a") as f:
-                    f.write(f"[RescueAgent {self.unique_id}] Dropped off {len(self.carrying)} citizens at safety.\n")
+                self.model.events.info("dropped_off", "[RescueAgent {rescuer}] Dropped off {count} citizens at safety.",
+                                       rescuer=self.unique_id, count=len(self.carrying))
                 for c in self.carrying:
                     c.state = CitizenState.SAFE
 
                     start_step = self.rescue_start_times.pop(c.unique_id, self.model.count)
                     evac_time = self.model.count - start_step
-                    with open(self.model.log_path_time, "a") as f:
-                        f.write(f"SAFE: RescueAgent: {self.unique_id}, Citizen: {c.unique_id}, time: {evac_time} steps [{start_step} - {self.model.count}]\n")
+                    self.model.events.info(
+                        "safe_time",
+                        "SAFE: RescueAgent: {rescuer}, Citizen: {citizen}, time: {time} steps [{start} - {end}]",
+                        stream="time", rescuer=self.unique_id, citizen=c.unique_id, time=evac_time,
+                        start=start_step, end=self.model.count,
+                    )
                 self.carrying.clear()
+                self.model.routing.release_route(self)
                 self.state = RescueState.AVAILABLE
             else:
                 self.move_along_path()
@@ -0,0 +1,494 @@
+import heapq
+import math
+
+import networkx as nx
+import numpy as np
+
+from agent_model.forecast import FloodForecast
+
+
+class RoutingService:
+    """
+    Shared routing for all agents of a model (owned by the model, not by agents).
+
+    Searches run on the model's CompiledGraph (CSR adjacency, node indices). Unsafe
+    roads are excluded with a per-edge mask instead of a subgraph copy. The cache is
+    versioned: the model calls `invalidate()` when a flood update actually changes edge
+    safety, and the mask is rebuilt lazily on the next query.
+
+    It also keeps a distance field to the model's safety spots (one multi-source
+    Dijkstra for the whole graph), so citizens look up their next hop instead of running
+    their own Dijkstra. Like the per-citizen search it replaced, the field goes by road
+    length over all roads, so it does not depend on edge safety and is built only once
+    per set of safety spots.
+
+    Routes of agents on a mission (plan_route) are kept as IncrementalRoute searches
+    and indexed by the edges still ahead of the agent. When a flood update makes edges
+    unsafe, repair_routes() finds the agents whose routes cross them and lets them
+    repair the route from the previous search state; other routes are left alone.
+
+    With model.routing_mode == "forecast" routes also take the saved future flood frames
+    into account (FloodForecast): an edge may only be used if the agent gets off it before
+    the flood update that makes it unsafe (earliest_arrival). Such routes avoid flooding by
+    construction, so they are not kept for repairs.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version = 0
+        self._safe_mask = None
+        self._safe_mask_version = -1
+        self._safety_field = None
+        self._safety_field_spots = None
+        self.routes = {}          # agent -> IncrementalRoute of its current mission
+        self.route_edges = {}     # agent -> edge ids of its registered path
+        self.routes_by_edge = {}  # edge id -> agents whose registered path uses it
+        self._forecast = None
+        self.forecast_routes = {}  # citizen -> remaining forecast path (node labels) to safety
+
+    def invalidate(self):
+        """Marks the cached safe-edge mask and safety field as stale (edge safety has changed)."""
+        self.version += 1
+
+    def safe_mask(self):
+        """Per-edge list of booleans, True for edges marked as safe."""
+        if self._safe_mask_version != self.version:
+            self._safe_mask = self.model.edge_safe.tolist()
+            self._safe_mask_version = self.version
+            self.model.profiler.count("safe_mask_builds")
+        return self._safe_mask
+
+    def shortest_path(self, source, target, weight="length"):
+        """
+        Shortest path (list of nodes) avoiding unsafe roads; falls back to the full graph
+        if the target cannot be reached over safe edges only.
+
+        Raises nx.NetworkXNoPath / nx.NodeNotFound if there is no path at all.
+        """
+        graph = self.model.graph
+        for n in (source, target):
+            if n not in graph.node_index:
+                raise nx.NodeNotFound(f"Node {n} not in graph")
+        s, t = graph.node_index[source], graph.node_index[target]
+        profiler = self.model.profiler
+        profiler.count("dijkstra")
+        try:
+            path = graph.shortest_path(s, t, edge_mask=self.safe_mask())
+        except nx.NetworkXNoPath:
+            profiler.count("dijkstra")
+            path = graph.shortest_path(s, t)
+        return [graph.node_ids[i] for i in path]
+
+    def distances(self, source):
+        """Road distance from node `source` to every reachable node (dict node -> distance), ignoring safety."""
+        graph = self.model.graph
+        self.model.profiler.count("dijkstra")
+        return {graph.node_ids[i]: d for i, d in graph.distances(graph.node_index[source]).items()}
+
+    def plan_route(self, agent, source, target, depart=None):
+        """
+        Shortest safe path (node labels) from `source` to `target` for `agent`, kept for
+        later repairs. If the target cannot be reached over safe edges, falls back to
+        shortest_path() on the full graph and the route is not kept.
+
+        In forecast mode the earliest-arrival path for the agent's speed, leaving at step
+        `depart` (default: the current step), is returned instead when one exists.
+
+        Raises nx.NetworkXNoPath / nx.NodeNotFound if there is no path at all.
+        """
+        graph = self.model.graph
+        for n in (source, target):
+            if n not in graph.node_index:
+                raise nx.NodeNotFound(f"Node {n} not in graph")
+        if self.model.routing_mode == "forecast":
+            found = self.forecast_path(source, [target], agent.speed,
+                                       self.model.count if depart is None else depart)
+            if found is not None:
+                self.release_route(agent)
+                return found[0]
+        self.model.profiler.count("dijkstra")
+        route = IncrementalRoute(graph, graph.node_index[target], self.model.edge_safe)
+        path = route.path(graph.node_index[source])
+        if path is None:
+            # no safe path: same result as shortest_path(), without repeating the safe search
+            self.release_route(agent)
+            self.model.profiler.count("dijkstra")
+            return [graph.node_ids[i] for i in graph.shortest_path(graph.node_index[source], route.goal)]
+        self.routes[agent] = route
+        path = [graph.node_ids[i] for i in path]
+        self.register_path(agent, path)
+        return path
+
+    def register_path(self, agent, path):
+        """Indexes the edges of `path` (node labels) as the ones `agent` is going to drive along."""
+        self.unregister_path(agent)
+        graph = self.model.graph
+        edges = [graph.edge_id(u, v) for u, v in zip(path, path[1:])]
+        self.route_edges[agent] = edges
+        for e in edges:
+            self.routes_by_edge.setdefault(e, set()).add(agent)
+
+    def advance_path(self, agent):
+        """Drops the first edge of the path registered for `agent` from the index (the agent has driven along it)."""
+        edges = self.route_edges.get(agent)
+        if not edges:
+            return
+        e = edges.pop(0)
+        if e not in edges:
+            agents = self.routes_by_edge.get(e)
+            if agents is not None:
+                agents.discard(agent)
+                if not agents:
+                    del self.routes_by_edge[e]
+
+    def unregister_path(self, agent):
+        for e in self.route_edges.pop(agent, ()):
+            agents = self.routes_by_edge.get(e)
+            if agents is not None:
+                agents.discard(agent)
+                if not agents:
+                    del self.routes_by_edge[e]
+
+    def release_route(self, agent):
+        """Forgets the route of `agent` (mission finished or replaced by an unrepairable path)."""
+        self.routes.pop(agent, None)
+        self.unregister_path(agent)
+
+    def affected_agents(self, edges):
+        """Agents with a kept route whose registered path uses any of `edges` (in unique_id order)."""
+        agents = set()
+        for e in edges:
+            agents.update(self.routes_by_edge.get(e, ()))
+        return sorted((a for a in agents if a in self.routes), key=lambda a: a.unique_id)
+
+    def repair_route(self, agent, start):
+        """
+        Repaired shortest safe path (node labels) from node `start` to the goal of the agent's
+        route, searching only where the safety changes since the last search matter.
+        Falls back to shortest_path() (and drops the route) if the goal is no longer
+        reachable over safe edges.
+        """
+        graph = self.model.graph
+        route = self.routes[agent]
+        route.update(self.model.edge_safe)
+        self.model.profiler.count("route_repairs")
+        path = route.path(graph.node_index[start])
+        if path is None:
+            self.release_route(agent)
+            self.model.profiler.count("dijkstra")
+            return [graph.node_ids[i] for i in graph.shortest_path(graph.node_index[start], route.goal)]
+        return [graph.node_ids[i] for i in path]
+
+    def repair_routes(self, changed):
+        """
+        Called after a flood update with the ids of edges whose safety changed: every agent whose
+        route crosses one of the edges that became unsafe gets `agent.repair_route()` called.
+        """
+        unsafe = [e for e in changed if not self.model.edge_safe[e]]
+        for agent in self.affected_agents(unsafe):
+            agent.repair_route()
+
+    def forecast(self):
+        """FloodForecast of the model, built on first use."""
+        if self._forecast is None:
+            self._forecast = FloodForecast(self.model)
+        return self._forecast
+
+    def travel_steps(self, speed):
+        """Per-edge list: steps needed to drive along the edge at `speed` (progress speed / length per step)."""
+        return np.maximum(1.0, np.ceil(self.model.edge_length / max(speed, 1e-9))).tolist()
+
+    def travel_steps_of(self, e, speed):
+        """Steps needed to drive along edge `e` at `speed`."""
+        return max(1.0, math.ceil(self.model.edge_length[e] / max(speed, 1e-9)))
+
+    def forecast_path(self, source, targets, speed, depart):
+        """
+        Earliest-arrival path (node labels) from `source` to the first reachable node of
+        `targets` at `speed`, leaving at step `depart`, using only edges the agent gets off
+        before they flood. Returns (path, arrival step) or None if water cuts off every target.
+        """
+        graph = self.model.graph
+        self.model.profiler.count("dijkstra")
+        found = earliest_arrival(graph, graph.node_index[source], {graph.node_index[n] for n in targets},
+                                 depart, self.travel_steps(speed), self.forecast().closing_steps(depart))
+        if found is None:
+            return None
+        path, arrival = found
+        return [graph.node_ids[i] for i in path], arrival
+
+    def next_hop_forecast(self, agent, node):
+        """
+        Next node towards safety for a citizen in forecast mode. The citizen's forecast path
+        is reused while it is still at the node the path continues from and can still get
+        off the next edge before it floods (at its current speed); otherwise it is planned
+        again. Falls back to next_hop_to_safety() when water cuts off every safety spot.
+        """
+        graph = self.model.graph
+        count = self.model.count
+        route = self.forecast_routes.get(agent)
+        if route is not None and len(route) > 1 and route[0] == node:
+            e = graph.edge_id(route[0], route[1])
+            if count + self.travel_steps_of(e, agent.current_speed) <= self.forecast().closing_steps(count)[e]:
+                route.pop(0)
+                return route[0]
+        found = None
+        if node in graph.node_index and node not in self.model.safety_spot:
+            found = self.forecast_path(node, self.model.safety_spot, agent.current_speed, count)
+        if found is None:
+            self.forecast_routes.pop(agent, None)
+            return self.next_hop_to_safety(node)
+        route = found[0][1:]
+        self.forecast_routes[agent] = route
+        return route[0]
+
+    def release_forecast_routes(self, agents):
+        """Forgets the forecast paths of citizens that stopped walking (reached safety or got flooded)."""
+        if self.forecast_routes:
+            for agent in agents:
+                self.forecast_routes.pop(agent, None)
+
+    def safety_field(self):
+        """
+        Distance to the nearest safety spot and the next hop towards it for every node index,
+        as two lists (inf / -1 for unreachable nodes; the spots are their own next hop).
+        """
+        spots = tuple(self.model.safety_spot)
+        if self._safety_field is None or self._safety_field_spots != spots:
+            graph = self.model.graph
+            self._safety_field = multi_source_dijkstra(graph, [graph.node_index[n] for n in spots])
+            self._safety_field_spots = spots
+            self.model.profiler.count("dijkstra")
+            self.model.profiler.count("safety_field_builds")
+        return self._safety_field
+
+    def clear_safety_field(self):
+        """Drops the cached distance field (rebuilt on the next query)."""
+        self._safety_field = None
+
+    def next_hop_to_safety(self, node):
+        """Next node on the shortest path from `node` to the nearest safety spot (None if unreachable)."""
+        _, next_hop = self.safety_field()
+        graph = self.model.graph
+        i = graph.node_index.get(node)
+        if i is None or next_hop[i] < 0 or next_hop[i] == i:
+            return None
+        return graph.node_ids[next_hop[i]]
+
+
+def multi_source_dijkstra(graph, sources):
+    """
+    Reverse Dijkstra grown from all `sources` (node indices) at once on a CompiledGraph.
+    Returns (dist, next_hop) lists indexed by node index: distance to the nearest source
+    and the neighbour to step to in order to get there (the node itself for a source,
+    -1 if unreachable).
+    """
+    n = graph.number_of_nodes
+    dist = [float("inf")] * n
+    next_hop = [-1] * n
+    done = [False] * n
+    adjacency = graph._adjacency
+    lengths = graph._edge_length
+    heap = [(0.0, i, s, s) for i, s in enumerate(sources)]
+    heapq.heapify(heap)
+    counter = len(heap)
+    while heap:
+        d, _, node, hop = heapq.heappop(heap)
+        if done[node]:
+            continue
+        done[node] = True
+        dist[node] = d
+        next_hop[node] = hop
+        for neighbor, edge in adjacency[node]:
+            if done[neighbor]:
+                continue
+            heapq.heappush(heap, (d + lengths[edge], counter, neighbor, node))
+            counter += 1
+    return dist, next_hop
+
+
+def earliest_arrival(graph, source, targets, depart, travel, closing):
+    """
+    Time-dependent label-setting search on a CompiledGraph. Leaving node `source` at step
+    `depart`, an edge e entered at step t is left at step t + travel[e] and may only be used
+    if that is not later than closing[e] (the step of the flood update that makes it unsafe).
+    Waiting is not allowed; since entering an edge earlier never leaves it later, the first
+    label settled at a node is the earliest arrival there (ties: shorter road length), so
+    one Dijkstra-like pass over (arrival step, length) suffices - no time-expanded copy of
+    the graph is needed.
+
+    Returns (path as node indices, arrival step) for the first of `targets` (a set of node
+    indices) that is settled, or None if none of them can be reached.
+    """
+    adjacency = graph._adjacency
+    lengths = graph._edge_length
+    pred = {source: -1}
+    done = set()
+    heap = [(depart, 0.0, source)]
+    best = {source: (depart, 0.0)}
+    while heap:
+        t, d, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        if node in targets:
+            path = [node]
+            while pred[path[-1]] >= 0:
+                path.append(pred[path[-1]])
+            path.reverse()
+            return path, t
+        for neighbor, edge in adjacency[node]:
+            if neighbor in done:
+                continue
+            arrive = t + travel[edge]
+            if arrive > closing[edge]:
+                continue
+            label = (arrive, d + lengths[edge])
+            old = best.get(neighbor)
+            if old is None or label < old:
+                best[neighbor] = label
+                pred[neighbor] = node
+                heapq.heappush(heap, (arrive, label[1], neighbor))
+    return None
+
+
+class IncrementalRoute:
+    """
+    Shortest safe route to a fixed goal that can be repaired after edge safety changes,
+    reusing the previous search (D* Lite / LPA* searching backwards from the goal).
+
+    g[u] is the distance from u to the goal found so far, rhs[u] the one-step lookahead
+    min(cost(u, v) + g[v]); nodes where they differ wait in the priority queue. A search
+    stops as soon as the current start is consistent, so later searches only re-expand the
+    nodes whose distance actually changed. The heuristic is zero (road lengths are not
+    bounded by straight-line distances in every projection), which also makes the keys
+    independent of the start, so the rescuer can move between searches without the
+    D* Lite key modifier.
+
+    Unsafe edges have infinite cost. `safe` is the edge safety the search state is
+    consistent with; update() applies the difference to the current safety.
+    """
+
+    def __init__(self, graph, goal, safe):
+        self.graph = graph
+        self.goal = goal
+        self.safe = safe.copy()
+        self.cost = np.where(self.safe, graph.edge_length, math.inf).tolist()
+        n = graph.number_of_nodes
+        self.g = [math.inf] * n
+        self.rhs = [math.inf] * n
+        self.rhs[goal] = 0.0
+        self.queued = [None] * n  # key under which the node is in the queue (stale heap entries are skipped)
+        self.heap = []
+        self._enqueue(goal)
+
+    def _enqueue(self, u):
+        g, rhs = self.g[u], self.rhs[u]
+        if g != rhs:
+            key = min(g, rhs)
+            if self.queued[u] != key:
+                self.queued[u] = key
+                heapq.heappush(self.heap, (key, u))
+        else:
+            self.queued[u] = None
+
+    def _lookahead(self, u):
+        cost, g = self.cost, self.g
+        return min((cost[e] + g[v] for v, e in self.graph._adjacency[u]), default=math.inf)
+
+    def compute(self, start):
+        """Runs the search until `start` is consistent; returns its distance to the goal (inf if unreachable)."""
+        g, rhs, cost, queued, heap = self.g, self.rhs, self.cost, self.queued, self.heap
+        adjacency = self.graph._adjacency
+        goal = self.goal
+        expanded = 0
+        while heap:
+            key, u = heapq.heappop(heap)
+            if queued[u] != key:
+                continue
+            if g[start] == rhs[start] and key >= g[start]:
+                heapq.heappush(heap, (key, u))
+                break
+            queued[u] = None
+            expanded += 1
+            if g[u] > rhs[u]:
+                # overconsistent: distance decreased, propagate to neighbours (enqueue inlined)
+                g[u] = gu = rhs[u]
+                for v, e in adjacency[u]:
+                    d = cost[e] + gu
+                    if d < rhs[v] and v != goal:
+                        rhs[v] = d
+                        gv = g[v]
+                        if gv != d:
+                            key = d if d < gv else gv
+                            if queued[v] != key:
+                                queued[v] = key
+                                heapq.heappush(heap, (key, v))
+                        else:
+                            queued[v] = None
+            else:
+                # underconsistent: distance increased, neighbours that relied on u look again
+                # (rhs[u] depends only on the neighbours, so u just goes back to the queue)
+                g_old = g[u]
+                g[u] = math.inf
+                self._enqueue(u)
+                for v, e in adjacency[u]:
+                    if rhs[v] == cost[e] + g_old and v != goal:
+                        best = math.inf
+                        for w, f in adjacency[v]:
+                            d = cost[f] + g[w]
+                            if d < best:
+                                best = d
+                        rhs[v] = best
+                        self._enqueue(v)
+        self.expanded = expanded
+        return g[start]
+
+    def update(self, safe):
+        """Applies edge safety `safe` (bool array per edge); returns the edge ids whose safety changed."""
+        changed = np.flatnonzero(self.safe != safe)
+        g, rhs, cost = self.g, self.rhs, self.cost
+        lengths = self.graph._edge_length
+        goal = self.goal
+        ends = zip(changed.tolist(), self.graph.edge_u[changed].tolist(), self.graph.edge_v[changed].tolist(),
+                   safe[changed].tolist())
+        for e, u, v, ok in ends:
+            old = cost[e]
+            cost[e] = new = lengths[e] if ok else math.inf
+            for a, b in ((u, v), (v, u)):
+                if a == goal:
+                    continue
+                if new < old:
+                    if new + g[b] < rhs[a]:
+                        rhs[a] = new + g[b]
+                        self._enqueue(a)
+                elif rhs[a] == old + g[b]:
+                    rhs[a] = self._lookahead(a)
+                    self._enqueue(a)
+        self.safe[changed] = safe[changed]
+        return changed
+
+    def path(self, start):
+        """
+        Node indices of the shortest safe path from `start` to the goal (following the
+        smallest cost + g), or None if the goal is unreachable over safe edges.
+        """
+        if self.compute(start) == math.inf:
+            return None
+        cost, g = self.cost, self.g
+        adjacency = self.graph._adjacency
+        path = [start]
+        visited = {start}
+        u = start
+        while u != self.goal:
+            best, best_d = None, math.inf
+            for v, e in adjacency[u]:
+                d = cost[e] + g[v]
+                if d < best_d:
+                    best, best_d = v, d
+            if best is None or best in visited:
+                return None
+            path.append(best)
+            visited.add(best)
+            u = best
+        return path
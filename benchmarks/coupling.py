@@ -0,0 +1,96 @@
+"""
+Throughput of the coupled agent-hydrology mode against replaying precomputed frames.
+
+Both runs use the same seed, graph and flood scenario (DEM crop of TestModel, 2010 rain
+series, synthetic river mask: lowest cells of the crop, no road mask). Replay pays for
+precomputing and writing the frames up front; the coupled run advances the flood inside
+TestModel.step.
+
+    python -m benchmarks.coupling --agents 300 --steps 200
+"""
+import os
+import json
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from evac_model import TestModel, build_example_graph
+from agent_model.event_log import WARNING
+from flood_agent.model.flood_store import FloodStoreWriter
+from flood_agent.model.hydrology import RAIN_BLOCKS_2010, Hydrology, rain_series_from_blocks
+from flood_agent.model.terrain import STUDY_FACTOR, STUDY_WINDOW, read_window
+
+
+def load_height(dem_path):
+    """DEM crop used by TestModel (rows 2000:3200, cols 3500:4800, every 6th cell)."""
+    return read_window(dem_path, STUDY_WINDOW, STUDY_FACTOR)[0]
+
+
+def synthetic_hydrology(height, dt_seconds=600.0, river_fraction=0.03):
+    """Hydrology on `height` with the 2010 rain series and the lowest cells as the river."""
+    river_mask = height <= np.quantile(height, river_fraction)
+    roads_mask = np.zeros(height.shape, dtype=bool)
+    return Hydrology(height, roads_mask, river_mask, rain_series_from_blocks(RAIN_BLOCKS_2010, dt_seconds),
+                     dt_seconds=dt_seconds)
+
+
+def run_model(graph_path, dem_path, log_path, steps, **kwargs):
+    model = TestModel(roads_graph=build_example_graph(graph_path), dem_path=dem_path, log_path=log_path,
+                      render=None, log_level=WARNING, **kwargs)
+    start = perf_counter()
+    for _ in range(steps):
+        model.step()
+    elapsed = perf_counter() - start
+    model.close()
+    return model, elapsed
+
+
+def benchmark_coupling(graph_path, dem_path, n_agents=300, n_rescue_agents=5, steps=200, ratio=1.0, seed=0,
+                       flood_interval=1):
+    """
+    Runs the same scenario in replay and coupled mode and returns timings (seconds),
+    agent steps per second and the final water difference between the two modes
+    (frames are stored as float32).
+    """
+    height = load_height(dem_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        flood_path = os.path.join(tmp, "replay.flood")
+
+        # replay: frame i = hydrology after int((i + 1) * ratio) iterations, as the coupled run sees it
+        start = perf_counter()
+        hydrology = synthetic_hydrology(height)
+        writer = FloodStoreWriter(flood_path, shape=height.shape, dt_seconds=hydrology.dt_seconds * ratio)
+        for i in range(steps):
+            writer.append(hydrology.advance_to(int((i + 1) * ratio)))
+        writer.close()
+        precompute = perf_counter() - start
+
+        common = dict(n_agents=n_agents, n_rescue_agents=n_rescue_agents, seed=seed, flood_interval=flood_interval)
+        replay_model, replay = run_model(graph_path, dem_path, tmp, steps, flood_path=flood_path, **common)
+        coupled_model, coupled = run_model(graph_path, dem_path, tmp, steps, hydrology=synthetic_hydrology(height),
+                                           hydrology_ratio=ratio, **common)
+        diff = float(np.max(np.abs(replay_model.water - coupled_model.water)))
+
+    return {
+        "n_agents": n_agents, "steps": steps, "ratio": ratio, "flood_interval": flood_interval,
+        "replay_precompute_s": round(precompute, 4), "replay_run_s": round(replay, 4),
+        "replay_total_s": round(precompute + replay, 4), "coupled_run_s": round(coupled, 4),
+        "replay_steps_per_s": round(steps / replay, 2), "coupled_steps_per_s": round(steps / coupled, 2),
+        "final_water_max_abs_diff": diff,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coupled vs replay throughput of TestModel")
+    parser.add_argument("--graph", default="Data/krakow_roads2.graphml")
+    parser.add_argument("--dem", default="krakow_merged.tif")
+    parser.add_argument("--agents", type=int, default=300)
+    parser.add_argument("--rescuers", type=int, default=5)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--ratio", type=float, default=1.0)
+    parser.add_argument("--flood-interval", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(benchmark_coupling(args.graph, args.dem, args.agents, args.rescuers, args.steps, args.ratio,
+                                       flood_interval=args.flood_interval), indent=2))
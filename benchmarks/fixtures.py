@@ -0,0 +1,124 @@
+"""
+Reproducible inputs for the benchmark suite.
+
+Nothing here depends on the real DEM or flood results (which are not in the repository):
+the terrain is a seeded synthetic surface on the study grid, the flood is a level rising
+over it, and both are written once to the fixture directory in the formats TestModel reads
+(a GeoTIFF covering STUDY_WINDOW and a FloodStore file). The road graphs are the GraphML
+files shipped in Data/; graphs without raster positions (krakow_roads.graphml) are mapped
+onto the study grid by their coordinate extent.
+"""
+import os
+import json
+
+import numpy as np
+
+from flood_agent.model.flood_store import FloodStore, FloodStoreWriter
+from flood_agent.model.terrain import STUDY_FACTOR, STUDY_WINDOW
+
+# bump when the generated data changes, so stale fixtures are rebuilt
+FIXTURE_VERSION = 1
+FIXTURE_SEED = 2010
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixtures")
+
+# graph name -> GraphML path (relative to the repository root)
+GRAPHS = {
+    "4k": "Data/krakow_roads.graphml",    # ~4.3k lines
+    "24k": "Data/krakow_roads2.graphml",  # ~24.8k lines
+}
+
+STUDY_SHAPE = (-(-(STUDY_WINDOW[1] - STUDY_WINDOW[0]) // STUDY_FACTOR),
+               -(-(STUDY_WINDOW[3] - STUDY_WINDOW[2]) // STUDY_FACTOR))
+
+
+def synthetic_height(shape=STUDY_SHAPE, seed=FIXTURE_SEED):
+    """Smooth terrain [m]: a gentle slope towards a valley plus seeded hills and small-scale noise."""
+    rng = np.random.default_rng(seed)
+    rows, cols = shape
+    y, x = np.mgrid[0:rows, 0:cols] / max(rows, cols)
+    height = 200.0 + 8.0 * np.abs(y - 0.55) + 3.0 * x
+    for _ in range(12):
+        cy, cx = rng.random(2)
+        radius = 0.05 + 0.15 * rng.random()
+        height += rng.uniform(-3.0, 6.0) * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * radius ** 2))
+    height += 0.2 * rng.standard_normal(shape)
+    return height.astype(np.float32)
+
+
+def rising_flood(height, n_frames, peak_quantile=0.35, peak_depth=1.5):
+    """Frames of a water level rising linearly from the lowest cell to `peak_depth` above the given height quantile."""
+    low = float(height.min())
+    peak = float(np.quantile(height, peak_quantile)) + peak_depth
+    for level in np.linspace(low, peak, n_frames):
+        yield np.clip(level - height, 0, None).astype(np.float32)
+
+
+def write_dem(path, height, factor=STUDY_FACTOR, window=STUDY_WINDOW):
+    """
+    GeoTIFF large enough to contain `window`, with `height` repeated factor x factor inside it,
+    so read_window(path, window, factor) returns `height` again. Outside the window it is flat.
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+
+    r0, r1, c0, c1 = window
+    full = np.zeros((r1 + factor, c1 + factor), dtype=np.float32)
+    block = np.repeat(np.repeat(height, factor, axis=0), factor, axis=1)
+    full[r0:r0 + block.shape[0], c0:c0 + block.shape[1]] = block
+    with rasterio.open(path, "w", driver="GTiff", height=full.shape[0], width=full.shape[1], count=1,
+                       dtype="float32", crs="EPSG:2180", transform=from_origin(560000.0, 250000.0, 1.0, 1.0),
+                       compress="deflate", tiled=True) as dst:
+        dst.write(full, 1)
+
+
+def prepare(fixture_dir=DEFAULT_FIXTURE_DIR, n_frames=120, seed=FIXTURE_SEED):
+    """
+    Builds (once) the DEM and flood fixtures and returns their paths as a dict
+    {"dem": ..., "flood": ..., "height": height on the study grid}.
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    dem_path = os.path.join(fixture_dir, "dem.tif")
+    flood_path = os.path.join(fixture_dir, "flood.flood")
+    meta_path = os.path.join(fixture_dir, "fixtures.json")
+    meta = {"version": FIXTURE_VERSION, "seed": seed, "n_frames": n_frames, "shape": list(STUDY_SHAPE)}
+
+    height = synthetic_height(STUDY_SHAPE, seed)
+    stale = True
+    if os.path.exists(meta_path) and os.path.exists(dem_path) and os.path.exists(flood_path):
+        with open(meta_path) as f:
+            stale = json.load(f) != meta
+    if stale:
+        write_dem(dem_path, height)
+        with FloodStoreWriter(flood_path, STUDY_SHAPE, window=STUDY_WINDOW, downsample=STUDY_FACTOR,
+                              dt_seconds=600.0) as writer:
+            for frame in rising_flood(height, n_frames):
+                writer.append(frame)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+    return {"dem": dem_path, "flood": flood_path, "height": height}
+
+
+def flood_frames(fixture_dir=DEFAULT_FIXTURE_DIR):
+    """The fixture flood as a FloodStore (frames read lazily)."""
+    return FloodStore(prepare(fixture_dir)["flood"])
+
+
+def load_graph(name, shape=STUDY_SHAPE):
+    """
+    Road graph `name` (see GRAPHS) prepared like build_example_graph. Nodes without
+    pos_array_x / pos_array_y get raster positions from their x, y scaled to `shape`.
+    """
+    from agent_model.graph_cache import read_graph
+
+    G = read_graph(GRAPHS.get(name, name))
+    if any("pos_array_x" not in data for _, data in G.nodes(data=True)):
+        xs = np.array([float(data["x"]) for _, data in G.nodes(data=True)])
+        ys = np.array([float(data["y"]) for _, data in G.nodes(data=True)])
+        cols = np.rint((xs - xs.min()) / max(np.ptp(xs), 1e-9) * (shape[1] - 1)).astype(int)
+        rows = np.rint((ys.max() - ys) / max(np.ptp(ys), 1e-9) * (shape[0] - 1)).astype(int)
+        for (_, data), row, col in zip(G.nodes(data=True), rows, cols):
+            data["pos_array_x"], data["pos_array_y"] = int(col), int(row)
+    for _, data in G.nodes(data=True):
+        data["pos"] = (float(data["x"]), float(data["y"]))
+        data["pos_array"] = (int(data["pos_array_x"]), int(data["pos_array_y"]))
+    return G
@@ -0,0 +1,159 @@
+"""
+Runner of the benchmark suite (benchmarks.suite).
+
+Every parameter set is set up once, run once as a warm-up and then timed `--repeat`
+times (`number` calls per measurement, state reset untimed in between). Results are
+written as JSON with the environment (versions, git commit, fixture version) so runs
+on different commits can be compared:
+
+    python -m benchmarks.run --quick --out before.json
+    python -m benchmarks.run --quick --out after.json --compare before.json
+    python -m benchmarks.run --filter model_step --max-citizens 10000
+"""
+import os
+import gc
+import sys
+import json
+import fnmatch
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+from time import perf_counter
+
+from benchmarks import fixtures
+from benchmarks.suite import BENCHMARKS
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(quick):
+    import numpy
+    import networkx
+    import mesa
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "networkx": networkx.__version__,
+        "mesa": mesa.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "fixture_version": fixtures.FIXTURE_VERSION,
+        "fixture_seed": fixtures.FIXTURE_SEED,
+        "quick": quick,
+    }
+
+
+def result_key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def time_case(case, repeat):
+    """Seconds per call of case.run() for each of `repeat` measurements (after one warm-up)."""
+    case.reset()
+    case.run()
+    times = []
+    for _ in range(repeat):
+        case.reset()
+        gc.collect()
+        start = perf_counter()
+        for _ in range(case.number):
+            case.run()
+        times.append((perf_counter() - start) / case.number)
+    return times
+
+
+def run_benchmark(bench, params, repeat, fixture_dir):
+    case = bench.setup(**params, fixture_dir=fixture_dir)
+    try:
+        times = time_case(case, repeat)
+    finally:
+        case.close()
+    return {
+        "name": bench.name,
+        "params": params,
+        "number": case.number,
+        "repeat": repeat,
+        "times_s": times,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+        "info": case.info,
+    }
+
+
+def selected(patterns, quick, max_citizens):
+    """(benchmark, params) pairs matching any of the name patterns (fnmatch, all if none)."""
+    for name, bench in BENCHMARKS.items():
+        if patterns and not any(fnmatch.fnmatch(name, p) or p in name for p in patterns):
+            continue
+        for params in (bench.quick_params if quick else bench.params):
+            if max_citizens is not None and params.get("n_citizens", 0) > max_citizens:
+                continue
+            yield bench, params
+
+
+def compare(results, baseline):
+    """Table of median times against a baseline results file (ratio > 1 means slower now)."""
+    base = {result_key(r): r for r in baseline["results"]}
+    lines = [f"{'benchmark':<26} {'params':<60} {'baseline':>10} {'current':>10} {'ratio':>7}"]
+    for r in results:
+        b = base.get(result_key(r))
+        params = " ".join(f"{k}={v}" for k, v in r["params"].items())
+        if b is None:
+            lines.append(f"{r['name']:<26} {params:<60} {'-':>10} {r['median_s']:>10.5f} {'-':>7}")
+        else:
+            lines.append(f"{r['name']:<26} {params:<60} {b['median_s']:>10.5f} {r['median_s']:>10.5f} "
+                         f"{r['median_s'] / b['median_s']:>7.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the simulation hot paths")
+    parser.add_argument("--filter", nargs="*", default=[], help="benchmark name patterns (e.g. flood_step 'model_*')")
+    parser.add_argument("--quick", action="store_true", help="small parameter sets only")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-citizens", type=int, default=None, help="skip parameter sets with more citizens")
+    parser.add_argument("--fixtures", default=fixtures.DEFAULT_FIXTURE_DIR, help="directory of generated fixtures")
+    parser.add_argument("--out", default=None, help="results JSON (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--list", action="store_true", help="list the selected benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    cases = list(selected(args.filter, args.quick, args.max_citizens))
+    if args.list:
+        for bench, params in cases:
+            print(bench.name, json.dumps(params))
+        return
+
+    fixtures.prepare(args.fixtures)
+    results = []
+    for bench, params in cases:
+        result = run_benchmark(bench, params, args.repeat, args.fixtures)
+        results.append(result)
+        print(f"{bench.name:<26} {json.dumps(params):<70} median {result['median_s'] * 1000:10.3f} ms"
+              f"  min {result['min_s'] * 1000:10.3f} ms", flush=True)
+
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                   datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"environment": environment(args.quick), "results": results}, f, indent=2)
+    print(f"Results written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(results, json.load(f)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
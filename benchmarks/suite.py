@@ -0,0 +1,290 @@
+"""
+Benchmark definitions: the simulation hot paths at increasing scale.
+
+Every benchmark is a setup function registered with @benchmark under a name and a list of
+parameter sets. Setup builds the inputs from the fixtures (untimed) and returns a Case;
+the runner (benchmarks.run) times `case.run()`, calling `case.reset()` untimed before
+every repetition. All agent benchmarks use a TestModel replaying the fixture flood, seeded
+with BENCH_SEED and stopped in the middle of the flood, so part of the roads is unsafe.
+"""
+import itertools
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks import fixtures
+
+BENCH_SEED = 0
+MID_FLOOD_FRAME = 80  # frame of the fixture flood the agent benchmarks start from
+
+BENCHMARKS = {}
+
+
+class Benchmark:
+    def __init__(self, name, setup, params, quick_params):
+        self.name = name
+        self.setup = setup
+        self.params = params
+        self.quick_params = quick_params
+
+
+class Case:
+    """
+    Prepared benchmark: `run` is timed (`number` calls per measurement), `reset` restores
+    the state between repetitions, `close` releases resources. `info` is stored with the result.
+    """
+
+    def __init__(self, run, reset=None, close=None, number=1, info=None):
+        self.run = run
+        self.reset = reset or (lambda: None)
+        self.close = close or (lambda: None)
+        self.number = number
+        self.info = info or {}
+
+
+def grid(**axes):
+    """Cartesian product of the parameter axes as a list of dicts."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[n] for n in names))]
+
+
+def benchmark(name, params, quick=None):
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, params, quick if quick is not None else params)
+        return setup
+    return register
+
+
+def make_model(graph, n_citizens, n_rescuers, fixture_dir, frame=MID_FLOOD_FRAME, **kwargs):
+    """
+    Headless TestModel on the fixture graph and flood, with the flood mapped at `frame`.
+    Returns (model, close, setup seconds).
+    """
+    from evac_model import TestModel
+    from agent_model.event_log import WARNING
+
+    paths = fixtures.prepare(fixture_dir)
+    G = fixtures.load_graph(graph)
+    log_dir = tempfile.TemporaryDirectory()
+    start = perf_counter()
+    model = TestModel(n_agents=n_citizens, n_rescue_agents=n_rescuers, roads_graph=G, dem_path=paths["dem"],
+                      log_path=log_dir.name, flood_path=paths["flood"], render=None, log_level=WARNING,
+                      seed=BENCH_SEED, **kwargs)
+    model.count = frame
+    model.flood_step()
+    elapsed = perf_counter() - start
+
+    def close():
+        model.close()
+        log_dir.cleanup()
+    return model, close, elapsed
+
+
+@benchmark("flood_step",
+           params=grid(size=[64, 128, 256, 512, 1024, 2048], backend=["numpy"]) + grid(size=[64], backend=["loop"]),
+           quick=grid(size=[64, 256], backend=["numpy"]))
+def bench_flood_step(size, backend, fixture_dir):
+    """flood_agent.model.flow.flood_step on a size x size grid with water at mid flood."""
+    from flood_agent.model.flow import flood_step
+
+    height = fixtures.synthetic_height((size, size), fixtures.FIXTURE_SEED)
+    frames = list(fixtures.rising_flood(height, 3))
+    water = frames[1].astype(float)
+    roads_mask = np.random.default_rng(fixtures.FIXTURE_SEED).random((size, size)) < 0.1
+    return Case(lambda: flood_step(height, water, 0.15, roads_mask, backend=backend),
+                number=1 if backend == "loop" or size >= 1024 else 10,
+                info={"wet_cells": int(np.count_nonzero(water))})
+
+
+@benchmark("model_flood_step", params=grid(graph=["4k", "24k"], edge_depth_mode=["max", "endpoints"]),
+           quick=grid(graph=["24k"], edge_depth_mode=["max"]))
+def bench_model_flood_step(graph, edge_depth_mode, fixture_dir):
+    """TestModel.flood_step (depth mapping and edge safety) over consecutive frames of the rising flood."""
+    model, close, setup_s = make_model(graph, 0, 0, fixture_dir, frame=0, edge_depth_mode=edge_depth_mode)
+    n_frames = len(model.water_maps)
+
+    def run():
+        model.count = (model.count + 1) % n_frames
+        model.flood_step()
+
+    return Case(run, close=close, number=20,
+                info={"setup_s": setup_s, "nodes": len(model.node_ids), "edges": len(model.edge_list)})
+
+
+@benchmark("citizen_dijkstra", params=grid(graph=["4k", "24k"], field=["warm", "cold"], n_citizens=[200]),
+           quick=grid(graph=["24k"], field=["warm", "cold"], n_citizens=[200]))
+def bench_citizen_dijkstra(graph, field, n_citizens, fixture_dir):
+    """
+    CitizenAgent.dijikstra_path_choice for every citizen. "warm": the shared distance field
+    to the safety spots is cached; "cold": it is dropped before every measurement, so the
+    measurement includes building it (once per run of the model).
+    """
+    from agent_model.citizens.citizen_agent import CitizenAgent, CitizenDecisionMakingMode
+
+    model, close, setup_s = make_model(graph, n_citizens, 0, fixture_dir,
+                                       decision_modes=[CitizenDecisionMakingMode.DIJIKSTRA])
+    citizens = list(model.agents_by_type[CitizenAgent])
+    starts = [c.current_edge[0] for c in citizens]
+
+    def run():
+        for citizen, node in zip(citizens, starts):
+            citizen.dijikstra_path_choice(node)
+
+    def reset():
+        for citizen, node in zip(citizens, starts):
+            citizen.decision_making_mode = CitizenDecisionMakingMode.DIJIKSTRA
+            citizen.current_edge = (node, None)
+        if field == "cold":
+            model.routing.clear_safety_field()
+        else:
+            model.routing.safety_field()
+
+    return Case(run, reset=reset, close=close, info={"setup_s": setup_s, "nodes": len(model.node_ids)})
+
+
+@benchmark("rescuer_set_target", params=grid(graph=["4k", "24k"], n_rescuers=[20]),
+           quick=grid(graph=["24k"], n_rescuers=[20]))
+def bench_rescuer_set_target(graph, n_rescuers, fixture_dir):
+    """RescueAgent.set_target (safe-road shortest path) from every rescuer to one citizen each."""
+    from agent_model.citizens.citizen_agent import CitizenAgent
+    from agent_model.rescue_agent import RescueAgent, RescueState
+
+    model, close, setup_s = make_model(graph, n_rescuers, n_rescuers, fixture_dir)
+    rescuers = list(model.agents_by_type[RescueAgent])
+    citizens = list(model.agents_by_type[CitizenAgent])
+    starts = [r.current_edge[0] for r in rescuers]
+
+    def run():
+        for rescuer, citizen in zip(rescuers, citizens):
+            rescuer.set_target(citizen)
+
+    def reset():
+        for rescuer, node in zip(rescuers, starts):
+            rescuer.current_edge = (node, None)
+            rescuer.state = RescueState.AVAILABLE
+            rescuer.target = None
+            rescuer.path = []
+            rescuer.rescue_start_times.clear()
+
+    return Case(run, reset=reset, close=close, info={"setup_s": setup_s, "nodes": len(model.node_ids)})
+
+
+@benchmark("forecast_set_target", params=grid(graph=["4k", "24k"], routing_mode=["current", "forecast"], n_rescuers=[20]),
+           quick=grid(graph=["24k"], routing_mode=["current", "forecast"], n_rescuers=[20]))
+def bench_forecast_set_target(graph, routing_mode, n_rescuers, fixture_dir):
+    """
+    RescueAgent.set_target from every rescuer to one citizen each at the start of the flood,
+    routing over the roads safe now or (forecast) over the roads that stay dry until reached.
+    The flood forecast is built in setup (its time is in info).
+    """
+    from agent_model.citizens.citizen_agent import CitizenAgent
+    from agent_model.rescue_agent import RescueAgent, RescueState
+
+    model, close, setup_s = make_model(graph, n_rescuers, n_rescuers, fixture_dir, frame=0, routing_mode=routing_mode)
+    start = perf_counter()
+    if routing_mode == "forecast":
+        model.routing.forecast().closing_steps(model.count)
+    forecast_s = perf_counter() - start
+    rescuers = list(model.agents_by_type[RescueAgent])
+    citizens = list(model.agents_by_type[CitizenAgent])
+    starts = [r.current_edge[0] for r in rescuers]
+
+    def run():
+        for rescuer, citizen in zip(rescuers, citizens):
+            rescuer.set_target(citizen)
+
+    def reset():
+        for rescuer, node in zip(rescuers, starts):
+            rescuer.current_edge = (node, None)
+            rescuer.state = RescueState.AVAILABLE
+            rescuer.target = None
+            rescuer.path = []
+            rescuer.rescue_start_times.clear()
+
+    return Case(run, reset=reset, close=close, info={"setup_s": setup_s, "forecast_s": forecast_s})
+
+
+@benchmark("flood_update_routes",
+           params=grid(graph=["24k"], n_rescuers=[20, 100], replan=["incremental", "scratch", "none"]),
+           quick=grid(graph=["24k"], n_rescuers=[20], replan=["incremental", "scratch"]))
+def bench_flood_update_routes(graph, n_rescuers, replan, fixture_dir):
+    """
+    TestModel.flood_step over the whole rising flood (every frame) with every rescuer on a
+    mission planned on the dry graph. After each update that changes edge safety the routes
+    are: "incremental" - repaired only where they cross newly unsafe roads (route_repair),
+    "scratch" - planned again with plan_route for every rescuer on a mission, "none" - kept
+    (flood mapping cost only). Every measurement starts from the dry graph and fresh missions.
+    """
+    from agent_model.citizens.citizen_agent import CitizenAgent
+    from agent_model.rescue_agent import RescueAgent, RescueState
+
+    model, close, setup_s = make_model(graph, n_rescuers, n_rescuers, fixture_dir, frame=0,
+                                       route_repair=replan == "incremental")
+    rescuers = list(model.agents_by_type[RescueAgent])
+    citizens = list(model.agents_by_type[CitizenAgent])
+    starts = [r.current_edge[0] for r in rescuers]
+    n_frames = len(model.water_maps)
+
+    def run():
+        for frame in range(1, n_frames):
+            model.count = frame
+            version = model.routing.version
+            model.flood_step()
+            if replan == "scratch" and model.routing.version != version:
+                for rescuer in rescuers:
+                    if len(rescuer.path) > 1:
+                        rescuer.path = model.routing.plan_route(rescuer, rescuer.path[0], rescuer.path[-1])
+
+    def reset():
+        model.count = 0
+        model.flood_step()
+        for rescuer, citizen, node in zip(rescuers, citizens, starts):
+            rescuer.current_edge = (node, None)
+            rescuer.state = RescueState.AVAILABLE
+            rescuer.rescue_start_times.clear()
+            rescuer.set_target(citizen)
+
+    return Case(run, reset=reset, close=close,
+                info={"setup_s": setup_s, "frames": n_frames - 1})
+
+
+@benchmark("assign_rescue_tasks",
+           params=grid(graph=["24k"], dispatch_mode=["sequential", "greedy", "hungarian"],
+                       n_unsafe=[20, 200], n_rescuers=[5, 50]),
+           quick=grid(graph=["24k"], dispatch_mode=["sequential", "greedy"], n_unsafe=[20], n_rescuers=[5]))
+def bench_assign_rescue_tasks(graph, dispatch_mode, n_unsafe, n_rescuers, fixture_dir):
+    """CallCenterAgent.assign_rescue_tasks with `n_unsafe` critically unsafe citizens and all rescuers available."""
+    from agent_model.agent_store import CITIZEN
+    from agent_model.citizens.citizen_agent import CitizenState
+    from agent_model.rescue_agent import RescueAgent, RescueState
+
+    model, close, setup_s = make_model(graph, n_unsafe, n_rescuers, fixture_dir, dispatch_mode=dispatch_mode)
+    store = model.agent_store
+    store.set_state(store.slots(CITIZEN), CitizenState.CRITICALLY_UNSAFE.value)
+    rescuers = list(model.agents_by_type[RescueAgent])
+    starts = [r.current_edge[0] for r in rescuers]
+
+    def reset():
+        for rescuer, node in zip(rescuers, starts):
+            rescuer.current_edge = (node, None)
+            rescuer.state = RescueState.AVAILABLE
+            rescuer.target = None
+            rescuer.path = []
+            rescuer.rescue_start_times.clear()
+
+    return Case(model.call_center.assign_rescue_tasks, reset=reset, close=close, info={"setup_s": setup_s})
+
+
+@benchmark("model_step",
+           params=grid(n_citizens=[10, 100, 1000, 10000, 100000], agent_backend=["objects", "arrays"], graph=["24k"]),
+           quick=grid(n_citizens=[10, 100, 1000], agent_backend=["objects", "arrays"], graph=["24k"]))
+def bench_model_step(n_citizens, agent_backend, graph, fixture_dir):
+    """
+    Full headless TestModel.step (flood update every 5 steps, dispatch, all agents) with
+    5 rescuers. Repetitions continue the same run, so later ones see more flooded roads.
+    """
+    model, close, setup_s = make_model(graph, n_citizens, 5, fixture_dir, frame=0, agent_backend=agent_backend)
+    model.count = 0
+    return Case(model.step, close=close, number=5,
+                info={"setup_s": setup_s, "agents": len(model.agents)})
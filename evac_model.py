@@ -1,165 +1,286 @@
 import mesa
 import numpy as np
-import matplotlib.pyplot as plt
 import networkx as nx
-import random 
 import rasterio
 from rasterio.transform import rowcol
-from agent_model.citizens.citizen_agent import CitizenAgent
+from agent_model.citizens.citizen_agent import CitizenAgent, DEFAULT_DECISION_MODES
 from agent_model.call_center_agent import CallCenterAgent
 from agent_model.rescue_agent import RescueAgent
-#from flood_agent.model.model import flood_step
+from agent_model.routing import RoutingService
+from agent_model.agent_store import AgentStore
+from agent_model.compiled_graph import CompiledGraph
+from agent_model.graph_cache import read_graph
+from agent_model.event_log import EventLog, DEBUG
+from agent_model.profiler import StepProfiler
+from agent_model import rendering
+from flood_agent.model.flood_store import FloodStore
+from flood_agent.model.terrain import STUDY_FACTOR, STUDY_WINDOW, read_window
+#from flood_agent.model.flow import flood_step
 import os
 from datetime import datetime
 
 class TestModel(mesa.Model):
-    def __init__(self, n_agents, n_rescue_agents, roads_graph, dem_path, log_path):
-        super().__init__()
+    def __init__(self, n_agents, n_rescue_agents, roads_graph, dem_path, log_path, flood_path="Data/flood_run.flood",
+                 edge_depth_mode="max", flood_interval=5, dispatch_mode="sequential",
+                 log_level=DEBUG, log_output="text", render="inline", render_every=1, render_pause=0.2,
+                 agent_backend="objects", safety_spots=(13, 40), decision_modes=None, seed=None,
+                 hydrology=None, hydrology_ratio=1.0, profile=False, route_repair=True,
+                 routing_mode="current"):
+        # every random draw of the model and its agents goes through self.random / self.rng seeded here
+        super().__init__(seed=seed)
         self.count = 0
+        self.edge_depth_mode = edge_depth_mode  # "max" / "mean" over cells along the edge, or "endpoints"
+        self.flood_interval = flood_interval    # flood update every `flood_interval` steps
+        self.route_repair = route_repair        # repair rescuer routes crossing roads that became unsafe
+        self.safe_depth = 0.5                   # roads deeper than this [m] are unsafe
+        # "current": route over roads safe now; "forecast": also avoid roads that flood before they are reached
+        self.routing_mode = routing_mode
         self.log_path = os.path.join(log_path, "log.txt")
         self.log_path_time = os.path.join(log_path, "evac_time.txt")
+        # per-step phase timings and counters (profile=False: no-op, see StepProfiler)
+        self.profiler = StepProfiler(enabled=profile)
+        # buffered event sink for log.txt / evac_time.txt (and optionally events.jsonl)
+        self.events = EventLog(log_path, model=self, level=log_level, output=log_output)
+        # rendering: "inline" (same process), "process" (separate process) or None (headless)
+        self.render = render
+        self.render_every = render_every
+        self.render_pause = render_pause
+        self.renderer = None
 
         self.space = mesa.space.NetworkGrid(roads_graph) # Create a NetworkGrid based on the road graph
+        self.build_graph_index()
+        self.routing = RoutingService(self)
+        # agent state arrays; "objects" steps agents one by one, "arrays" moves citizens in vectorized batches
+        # (same trajectories as "objects", see CitizenAgent.step_batch)
+        self.agent_store = AgentStore(self)
+        self.agent_backend = agent_backend
+        # decision modes drawn by new citizens (repeats act as weights)
+        self.decision_modes = list(decision_modes) if decision_modes is not None else list(DEFAULT_DECISION_MODES)
         self.create_agents(n=n_agents, n2=n_rescue_agents)
-        self.call_center = CallCenterAgent(self)
-        self.safety_spot = [n for n in self.space.G.nodes if n in [13, 40]]  # Example of a safe spot node
+        self.call_center = CallCenterAgent(self, dispatch_mode=dispatch_mode)
+        self.safety_spot = [n for n in self.space.G.nodes if n in safety_spots]  # Example of a safe spot node
 
-        self.water_maps = self.load_water_maps("Data")
-        self.nrows, self.ncols = self.water_maps[0].shape
+        # coupled mode: the model owns the flood state (Hydrology) and advances it
+        # `hydrology_ratio` flood iterations per agent step; otherwise saved frames are replayed
+        self.hydrology = hydrology
+        self.hydrology_ratio = hydrology_ratio
+        if hydrology is not None:
+            self.water_maps = None
+            self.height = hydrology.height
+            self.water = hydrology.water
+        else:
+            self.water_maps = self.load_water_maps(flood_path)
 
-        with rasterio.open("krakow_merged.tif") as src:
-            height = src.read(1)
-        self.height = height[2000:3200, 3500:4800]
-        self.height = self.height[::6, ::6]
+            # only the study window of the DEM is read (and cached on disk)
+            self.height, _ = read_window(dem_path, STUDY_WINDOW, STUDY_FACTOR)
 
-        # mapowanie pierwszego kroku
-        self.water = self.water_maps[0]
+            # mapowanie pierwszego kroku
+            self.water = self.water_maps[0]
+        self.nrows, self.ncols = self.water.shape
+        if routing_mode not in ("current", "forecast"):
+            raise ValueError(f"Unknown routing_mode: {routing_mode!r}")
+        if routing_mode == "forecast" and self.water_maps is None:
+            raise ValueError("routing_mode='forecast' needs saved flood frames (not available with hydrology)")
 
-    def load_water_maps(self, folder_path):
-        """Wczytuje wszystkie zapisane pliki .npy z symulacji powodzi i sortuje je rosnąco po numerze kroku"""
-        files = sorted(
-            [f for f in os.listdir(folder_path) if f.endswith(".npy")],
-            key=lambda x: int(x.split("_")[-1].split(".")[0])
-        )
-        water_maps = [np.load(os.path.join(folder_path, f)) for f in files]
-        return water_maps
+    def build_graph_index(self):
+        """
+        Precomputes integer arrays used to map the flood raster onto the road graph:
+        raster row/col of every node and the node indices of both endpoints of every edge
+        (taken from the CompiledGraph, which also serves routing and movement lookups).
+        Node depths and edge safety are then computed with a single fancy-indexing
+        operation per flood update instead of Python loops over the graph.
+        """
+        G = self.space.G
+        # compact CSR form of the road graph, shared by routing and agent movement
+        self.graph = CompiledGraph(G)
+        self.node_ids = self.graph.node_ids
+        self.node_index = self.graph.node_index
+        self.node_cols = self.graph.node_cols
+        self.node_rows = self.graph.node_rows
+        self.edge_list = self.graph.edge_list
+        self.edge_u = self.graph.edge_u
+        self.edge_v = self.graph.edge_v
+        self.edge_length = self.graph.edge_length
+        # (node index, node index) -> edge index, both directions
+        self.edge_ids = self.graph.edge_ids
+
+        # published flood state, kept in sync with the networkx attributes
+        self.node_depth = np.zeros(len(self.node_ids))
+        self.edge_depth = np.zeros(len(self.edge_list))
+        self.edge_safe = np.array([G.edges[e].get("safe", "yes") == "yes" for e in self.edge_list], dtype=bool)
+        nx.set_edge_attributes(G, {e: "yes" if s else "no" for e, s in zip(self.edge_list, self.edge_safe)}, "safe")
+
+        self.build_edge_cells()
+
+    def build_edge_cells(self):
+        """
+        Precomputes the raster cells traversed by every edge (straight segment between the
+        `pos_array` positions of its endpoints), stored CSR-style: the cells of edge i are
+        edge_cell_rows/cols[edge_cell_ptr[i]:edge_cell_ptr[i + 1]], endpoints included.
+        """
+        r0, c0 = self.node_rows[self.edge_u], self.node_cols[self.edge_u]
+        dr = self.node_rows[self.edge_v] - r0
+        dc = self.node_cols[self.edge_v] - c0
+
+        # one sample per cell step along the longer axis
+        n_cells = np.maximum(np.abs(dr), np.abs(dc)) + 1
+        self.edge_cell_ptr = np.concatenate(([0], np.cumsum(n_cells)))
+        start = np.repeat(self.edge_cell_ptr[:-1], n_cells)
+        t = (np.arange(self.edge_cell_ptr[-1]) - start) / np.repeat(np.maximum(n_cells - 1, 1), n_cells)
+
+        self.edge_cell_rows = np.rint(np.repeat(r0, n_cells) + t * np.repeat(dr, n_cells)).astype(np.intp)
+        self.edge_cell_cols = np.rint(np.repeat(c0, n_cells) + t * np.repeat(dc, n_cells)).astype(np.intp)
+        self.edge_cell_count = n_cells
+
+    def compute_edge_depth(self, water=None):
+        """Depth of every edge according to self.edge_depth_mode, for the current water or the given frame."""
+        water = self.water if water is None else water
+        if self.edge_depth_mode == "endpoints":
+            node_depth = water[self.node_rows, self.node_cols].astype(float)
+            return np.maximum(node_depth[self.edge_u], node_depth[self.edge_v])
+
+        cell_depth = water[self.edge_cell_rows, self.edge_cell_cols].astype(float)
+        if self.edge_depth_mode == "max":
+            return np.maximum.reduceat(cell_depth, self.edge_cell_ptr[:-1])
+        if self.edge_depth_mode == "mean":
+            return np.add.reduceat(cell_depth, self.edge_cell_ptr[:-1]) / self.edge_cell_count
+        raise ValueError(f"Unknown edge_depth_mode: {self.edge_depth_mode!r}")
+
+    def load_water_maps(self, flood_path):
+        """
+        Otwiera plik wyników symulacji powodzi (FloodStore). Klatki czytane są leniwie po numerze
+        kroku (water_maps[i]), więc start nie zależy od długości symulacji.
+        Stare wyniki w postaci folderu z plikami .npy można przepisać przez convert_npy_folder.
+        """
+        return FloodStore(flood_path)
     
     def create_agents(self, n: int, n2: int):
         # Create 'n' citizen agents and assign them random starting nodes
         # TODO: Should be changed to realistic start positions
 
         for i in range(n2):
-            start_node = random.choice(list(self.space.G.nodes))
+            start_node = self.random.choice(self.node_ids)
             agent = RescueAgent(self, start_node=start_node)
             self.agents.add(agent)
             self.space.place_agent(agent, start_node)
 
         for i in range(n):
-            start_node = random.choice(list(self.space.G.nodes))
+            start_node = self.random.choice(self.node_ids)
             agent = CitizenAgent(self, start_node=start_node)
             self.agents.add(agent)
             self.space.place_agent(agent, start_node)
 
-        plt.ion()
-        self.fig, self.ax = plt.subplots(figsize=(10, 10))
-
     
     def flood_step(self):
         """
         Update flood simulation and map depth values to the road network.
+        In coupled mode the hydrology is advanced to step `count` (same frame as replaying
+        water_maps[count] at hydrology_ratio=1); otherwise the saved frame is read.
         """
         # --- Flood update ---
-        if self.count < len(self.water_maps):
+        if self.hydrology is not None:
+            self.water = self.hydrology.advance_to(int((self.count + 1) * self.hydrology_ratio))
+        elif self.count < len(self.water_maps):
             self.water = self.water_maps[self.count]
         else:
             self.water = self.water_maps[-1]
 
-        for n, data in self.space.G.nodes(data=True):
-            col, row = data['pos_array']
-            depth = float(self.water[row, col])
-            data["depth"] = depth
+        G = self.space.G
+        self.node_depth = self.water[self.node_rows, self.node_cols].astype(float)
+        nx.set_node_attributes(G, dict(zip(self.node_ids, self.node_depth.tolist())), "depth")
 
         # --- Mark unsafe roads ---
-        unsafe_edges = 0
-        for u, v, d in self.space.G.edges(data=True):
-            node_depth = max(
-                self.space.G.nodes[u].get("depth", 0),
-                self.space.G.nodes[v].get("depth", 0),
-            )
-            d["safe"] = "no" if node_depth > 0.5 else "yes"
-            if node_depth > 0.5:
-                unsafe_edges += 1
-                
-        with open(self.log_path, "a") as f:
-            f.write(f"Unsafe edges: {unsafe_edges}/{self.space.G.number_of_edges()}\n")
+        self.edge_depth = self.compute_edge_depth()
+        edge_safe = self.edge_depth <= self.safe_depth
+        # only edges whose safety flipped need their networkx attribute rewritten
+        changed = np.flatnonzero(edge_safe != self.edge_safe)
+        nx.set_edge_attributes(
+            G, {self.edge_list[i]: "yes" if edge_safe[i] else "no" for i in changed}, "safe"
+        )
+        self.edge_safe = edge_safe
+        self.profiler.count("edges_changed", changed.size)
+        if changed.size:
+            self.routing.invalidate()
+            if self.route_repair:
+                self.routing.repair_routes(changed.tolist())
+        unsafe_edges = int(np.count_nonzero(~edge_safe))
+
+        self.events.info("unsafe_edges", "Unsafe edges: {unsafe}/{total}",
+                         unsafe=unsafe_edges, total=self.space.G.number_of_edges())
         
     def step(self):
-        if self.count%5 == 0:
-            self.flood_step() # Update water depth on graph nodes, not shure if should be done every step
+        profiler = self.profiler
+        profiler.begin_step(self.count)
+        if self.count%self.flood_interval == 0:
+            with profiler.phase("flood"):
+                self.flood_step() # Update water depth on graph nodes, not shure if should be done every step
 
         if self.count%5 == 0:
-            self.call_center.step()
+            with profiler.phase("call_center"):
+                self.call_center.step()
 
         
-        self.agents.do("step")
-        self.visualise_step() # Visualize the current state of the model, just for testing
+        if self.agent_backend == "arrays":
+            if RescueAgent in self.agents_by_type:
+                with profiler.phase("agents.rescuers"):
+                    self.agents_by_type[RescueAgent].do("step")
+            with profiler.phase("agents.citizens"):
+                CitizenAgent.step_batch(self)
+        elif profiler.enabled:
+            self.step_agents_profiled()
+        else:
+            self.agents.do("step")
+        with profiler.phase("render"):
+            self.visualise_step() # Visualize the current state of the model (no-op in headless mode)
         
         self.count += 1
+        profiler.end_step()
 
-    def visualise_step(self):
-        ax = self.ax
-        ax.clear()
-        G = self.space.G
-        safety_spot = self.safety_spot
-        agents = self.agents
-        pos = nx.get_node_attributes(G, "pos_array")        
-
-        safe_edges = [(u, v) for u, v, d in G.edges(data=True) if d.get('safe') in ['yes']]
-        unsafe_edges = [(u, v) for u, v, d in G.edges(data=True) if d.get('safe') in ['no']]
-
-        # Wizualizacja agentów
-        agent_positions_x = []
-        agent_positions_y = []
-        rescue_agents_x = []
-        rescue_agents_y = []
-        for agent in agents:
-            if not isinstance(agent, (CitizenAgent, RescueAgent)):
-                continue
-            x0, y0 = pos[agent.current_edge[0]]
-            if agent.current_edge[1] is not None:
-                x1, y1 = pos[agent.current_edge[1]]
-                x = x0 + (x1 - x0) * agent.progress
-                y = y0 + (y1 - y0) * agent.progress
+    def step_agents_profiled(self):
+        """
+        Same as self.agents.do("step") (same order), with the time of every agent charged to
+        its phase: "agents.rescuers" or "agents.citizens.<decision mode>".
+        """
+        phase = self.profiler.phase
+        for agent in list(self.agents):
+            if isinstance(agent, CitizenAgent):
+                name = "agents.citizens." + agent.decision_making_mode.name.lower()
             else:
-                x, y = x0, y0
-            if isinstance(agent, RescueAgent):
-                rescue_agents_x.append(x)
-                rescue_agents_y.append(y)
-                continue
-            agent_positions_x.append(x)
-            agent_positions_y.append(y)
-
-        ax.imshow(self.height, cmap='terrain', origin='upper') 
-        ax.imshow(self.water, cmap='Blues', alpha=0.6, origin='upper', vmin=0, vmax=np.max(self.water)/3)
-        
-        nx.draw_networkx_nodes(G, pos, nodelist=safety_spot, node_size=100, label='Safe Nodes', node_color='green')
-        nx.draw_networkx_edges(G, pos, edgelist=safe_edges, edge_color='black', width=2, label='Safe Roads')
-        nx.draw_networkx_edges(G, pos, edgelist=unsafe_edges, edge_color='red', width=2, label='Unsafe Roads')
-
-        plt.scatter(agent_positions_x, agent_positions_y, c='blue', s=20, label='Agents', zorder=2)
-        plt.scatter(rescue_agents_x, rescue_agents_y, c='purple', s=20, label='Rescue Agents', zorder=2)
+                name = "agents.rescuers"
+            with phase(name):
+                agent.step()
 
-        plt.legend()
-        plt.title("Road network with agents")
+    def visualise_step(self):
+        """
+        Sends a snapshot of the current state to the renderer every `render_every` steps.
+        Rendering is skipped entirely in headless mode (render=None).
+        """
+        if self.render is None or self.count % self.render_every != 0:
+            return
+        if self.renderer is None:
+            scene = rendering.static_scene(self)
+            if self.render == "process":
+                self.renderer = rendering.ProcessRenderer(scene, pause=self.render_pause)
+            else:
+                self.renderer = rendering.Renderer(scene, pause=self.render_pause)
+        self.renderer.draw(rendering.snapshot(self, CitizenAgent, RescueAgent))
 
-        plt.draw()  # Update figure
-        plt.pause(0.2)
+    def close(self):
+        """Flushes the event log, writes the profile (profile.csv per step, profile.txt summary) and stops the renderer."""
+        self.events.close()
+        if self.profiler.enabled and self.profiler.rows:
+            self.profiler.write_csv(os.path.join(self.events.folder, "profile.csv"))
+            with open(os.path.join(self.events.folder, "profile.txt"), "w") as f:
+                f.write(self.profiler.table() + "\n")
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
 
 
 def build_example_graph(path):
     # Tworzenie TESTOWEGO grafu drogowego
-    G = nx.read_graphml(path)
-    G = nx.convert_node_labels_to_integers(G)
+    # (z binarnego cache obok pliku GraphML; przebudowywany, gdy zmieni się zawartość pliku)
+    G = read_graph(path)
     for n, data in G.nodes(data=True):
         data['pos'] = (float(data['x']), float(data['y']))
         data['pos_array'] = (int(data['pos_array_x']), int(data['pos_array_y']))
@@ -170,7 +291,6 @@ if __name__ == "__main__":
     curr_time = datetime.now().strftime("%H_%M_%S")
     folder_path = f"output/run_{curr_time}"
     os.makedirs(folder_path, exist_ok=True)
-    log_path = os.path.join(folder_path, "log.txt")
 
     graph_path = 'Data/krakow_roads2.graphml'
     dem_path = 'krakow_merged.tif'
@@ -181,14 +301,16 @@ if __name__ == "__main__":
     model = TestModel(n_agents=n_agents, n_rescue_agents=n_rescue_agents, roads_graph=G, dem_path=dem_path, log_path=folder_path)
     
     for t in range(200):
-        with open(log_path, "a") as f:
-            f.write(f"\n--- Step {t} ---\n")
+        model.events.info("step", "\n--- Step {step} ---", step=t)
         print(f"--- Step {t} ---")
         model.step()
+        if not model.events.enabled(DEBUG):
+            continue
         for a in model.agents:
             if isinstance(a, CitizenAgent):
-                with open(log_path, "a") as f:
-                    f.write(f"Agent {a.unique_id}: node={a.current_edge[0]}, state={a.state}\n")
+                model.events.debug("citizen_status", "Agent {agent}: node={node}, state={state}",
+                                   agent=a.unique_id, node=a.current_edge[0], state=a.state)
             elif isinstance(a, RescueAgent):
-                with open(log_path, "a") as f:
-                    f.write(f"RescueAgent {a.unique_id}: node={a.current_edge[0]}, carrying={[c.unique_id for c in a.carrying]}\n")
\ No newline at end of file
+                model.events.debug("rescuer_status", "RescueAgent {rescuer}: node={node}, carrying={carrying}",
+                                   rescuer=a.unique_id, node=a.current_edge[0], carrying=[c.unique_id for c in a.carrying])
+    model.close()
\ No newline at end of file
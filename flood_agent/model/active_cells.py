@@ -0,0 +1,132 @@
+import numpy as np
+
+from flood_agent.model.flow import NEIGHBOR_OFFSETS, flood_delta
+
+"""
+Solver przepływu ze śledzeniem aktywnych komórek (frontu zalania).
+
+Przez większość scenariusza woda jest tylko w korycie Wisły (river_mask) i na wąskim
+froncie zalania, a flood_step liczy całą mapę. Tutaj trzymamy listę mokrych komórek
+(water > eps) i w każdym kroku liczymy tylko je oraz ich 8 sąsiadów - koszt kroku
+zależy od zalanej powierzchni, a nie od rozmiaru DEM.
+
+Przy eps = 0 wynik jest taki sam jak flood_step (komórka sucha nic nie oddaje, więc
+zmienić się mogą tylko mokre komórki i ich sąsiedzi). Przy eps > 0 komórki z bardzo
+cienką warstwą wody są pomijane - szybciej, ale w przybliżeniu.
+
+Gdy deszcz pada równomiernie na całą mapę (add_rain), wszystko jest mokre - wtedy krok
+liczony jest globalnie (flood_delta na całej macierzy), a lista mokrych komórek
+odbudowywana od zera.
+"""
+
+
+class ActiveCellFloodSolver:
+    """
+    Parametry:
+    height: np.ndarray    - wysokość terenu (N x M)
+    roads_mask            - maska dróg (N x M)
+    water: np.ndarray     - początkowy słup wody (domyślnie zera)
+    eps: float            - próg wody [m], powyżej którego komórka jest mokra
+    dense_fraction: float - przy takim udziale mokrych komórek liczymy krok globalnie
+
+    Po każdym kroku w `active_counts` dopisywana jest liczba przeliczonych komórek.
+    Wodę zmienia się przez add_rain / add_water; po ręcznej zmianie `water` trzeba
+    wywołać mark_dirty().
+    """
+
+    def __init__(self, height, roads_mask, water=None, eps=0.0, dense_fraction=0.3):
+        self.height = np.asarray(height)
+        self.roads_mask = np.asarray(roads_mask, dtype=bool)
+        self.nrows, self.ncols = self.height.shape
+        self.water = np.zeros(self.height.shape, dtype=float) if water is None else np.array(water, dtype=float)
+        self.eps = eps
+        self.dense_fraction = dense_fraction
+
+        self.height_flat = self.height.ravel()
+        self.roads_flat = self.roads_mask.ravel()
+        self.offsets = np.array([di * self.ncols + dj for di, dj in NEIGHBOR_OFFSETS])
+
+        self.wet = np.zeros(self.water.size, dtype=bool)   # maska bitowa mokrych komórek
+        self.wet_idx = np.empty(0, dtype=np.intp)           # indeksy (płaskie) mokrych komórek
+        self.dirty = True
+        self.active_counts = []
+
+    def mark_dirty(self):
+        """Wymusza globalne przeliczenie listy mokrych komórek w następnym kroku."""
+        self.dirty = True
+
+    def add_rain(self, rain_m: float):
+        """Równomierny opad na całej mapie."""
+        self.water += rain_m
+        self.dirty = True
+
+    def add_water(self, mask, amount: float):
+        """Dodaje wodę lokalnie (np. koryto rzeki, pas przy wałach) bez globalnego przeliczenia."""
+        mask = np.asarray(mask)
+        idx = np.flatnonzero(mask.ravel()) if mask.dtype == bool else np.ravel_multi_index(mask, self.water.shape)
+        water_flat = self.water.ravel()
+        water_flat[idx] += amount
+        self.refresh_wet(idx)
+
+    def refresh_wet(self, idx):
+        """Aktualizuje maskę i listę mokrych komórek dla zmienionych komórek `idx`."""
+        water_flat = self.water.ravel()
+        self.wet[idx] = water_flat[idx] > self.eps
+        candidates = np.union1d(self.wet_idx, idx)
+        self.wet_idx = candidates[self.wet[candidates]]
+
+    def rebuild_wet(self):
+        self.wet = self.water.ravel() > self.eps
+        self.wet_idx = np.flatnonzero(self.wet)
+        self.dirty = False
+
+    def step(self, k: float) -> np.ndarray:
+        """Jeden krok przepływu; zwraca aktualną macierz wody."""
+        if self.dirty:
+            self.rebuild_wet()
+
+        if self.wet_idx.size > self.dense_fraction * self.water.size:
+            self.step_dense(k)
+        else:
+            self.step_sparse(k)
+        return self.water
+
+    def step_dense(self, k):
+        self.water[...] = np.clip(self.water + flood_delta(self.height, self.water, k, self.roads_mask), 0, None)
+        self.rebuild_wet()
+        self.active_counts.append(self.water.size)
+
+    def step_sparse(self, k):
+        water_flat = self.water.ravel()
+        cells = self.wet_idx
+
+        # tylko komórki wewnętrzne oddają wodę (jak w flood_step)
+        rows, cols = np.divmod(cells, self.ncols)
+        inner = (rows > 0) & (rows < self.nrows - 1) & (cols > 0) & (cols < self.ncols - 1)
+        cells = cells[inner]
+
+        # spadki do sąsiadów: wiersz = komórka, kolumna = kierunek
+        neighbors = cells[:, None] + self.offsets[None, :]
+        level = self.height_flat[cells] + water_flat[cells]
+        neighbor_level = self.height_flat[neighbors] + water_flat[neighbors]
+        flows = np.clip(level[:, None] - neighbor_level, 0, None)
+        flow_sum = flows.sum(axis=1)
+
+        water_cells = water_flat[cells]
+        active = (flow_sum > 0) & (water_cells > 0)
+        cells, neighbors, flows = cells[active], neighbors[active], flows[active]
+        flow_sum, water_cells = flow_sum[active], water_cells[active]
+
+        # współczynnik przepływu (drogi szybciej)
+        local_k = np.where(self.roads_flat[cells], 2.0 * k, k)
+        outflow = local_k * water_cells
+        share = outflow / flow_sum
+
+        # aktualizacja - najpierw odpływy, potem rozrzucenie do sąsiadów
+        water_flat[cells] -= outflow
+        np.add.at(water_flat, neighbors.ravel(), (flows * share[:, None]).ravel())
+
+        touched = np.union1d(cells, neighbors.ravel())
+        water_flat[touched] = np.maximum(water_flat[touched], 0)
+        self.refresh_wet(touched)
+        self.active_counts.append(touched.size)
@@ -0,0 +1,141 @@
+import os
+import json
+
+import numpy as np
+
+"""
+Zapis wyników symulacji powodzi w jednym pliku zamiast osobnych plików .npy na każdy krok.
+
+Format pliku:
+ - nagłówek o stałym rozmiarze HEADER_SIZE bajtów: MAGIC + JSON dopełniony spacjami
+   (transform, okno wycinka, downsampling, dt, dtype, kształt, liczba kroków),
+ - zaraz po nim kostka danych steps x rows x cols (float32 albo float16), wiersz po wierszu.
+
+Zapis jest strumieniowy - każda klatka dopisywana jest na koniec pliku, a licznik kroków
+w nagłówku aktualizowany po każdym dopisaniu. Odczyt to np.memmap na kostce: klatki
+wczytywane są z dysku dopiero przy dostępie, więc start modelu nie zależy od długości symulacji.
+"""
+
+MAGIC = b"FLOODST1"
+HEADER_SIZE = 4096
+
+
+def write_header(f, header: dict):
+    data = MAGIC + json.dumps(header).encode("utf-8")
+    if len(data) > HEADER_SIZE:
+        raise ValueError(f"Nagłówek za długi ({len(data)} B > {HEADER_SIZE} B)")
+    f.seek(0)
+    f.write(data.ljust(HEADER_SIZE, b" "))
+
+
+def read_header(path) -> dict:
+    with open(path, "rb") as f:
+        data = f.read(HEADER_SIZE)
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} nie jest plikiem wyników powodzi")
+    return json.loads(data[len(MAGIC):].decode("utf-8"))
+
+
+def affine_coefficients(transform):
+    """Współczynniki (a, b, c, d, e, f) transformacji - z obiektu Affine albo sekwencji."""
+    if hasattr(transform, "a"):
+        return [float(getattr(transform, name)) for name in "abcdef"]
+    return [float(v) for v in list(transform)[:6]]
+
+
+class FloodStoreWriter:
+    """
+    Strumieniowy zapis klatek wody do pliku wyników.
+
+    Parametry:
+    path: str             - ścieżka pliku wynikowego (nadpisywany)
+    shape: tuple          - (rows, cols) pojedynczej klatki
+    transform             - affine wycinka (rasterio Affine albo 6 współczynników a, b, c, d, e, f)
+    window: tuple         - okno wycinka w pełnym DEM (r0, r1, c0, c1)
+    downsample: int       - krok decymacji wycinka ([::downsample, ::downsample])
+    dt_seconds: float     - czas między kolejnymi klatkami [s]
+    dtype                 - np.float32 (domyślnie) albo np.float16
+    """
+
+    def __init__(self, path, shape, transform=None, window=None, downsample=1, dt_seconds=None, dtype=np.float32):
+        self.path = path
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.header = {
+            "dtype": self.dtype.name,
+            "shape": list(self.shape),
+            "steps": 0,
+            "transform": None if transform is None else affine_coefficients(transform),
+            "window": None if window is None else [int(v) for v in window],
+            "downsample": int(downsample),
+            "dt_seconds": dt_seconds,
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.f = open(path, "w+b")
+        write_header(self.f, self.header)
+
+    def append(self, frame: np.ndarray):
+        """Dopisuje jedną klatkę na koniec pliku."""
+        if frame.shape != self.shape:
+            raise ValueError(f"Zły kształt klatki {frame.shape}, oczekiwano {self.shape}")
+        self.f.seek(0, os.SEEK_END)
+        self.f.write(np.ascontiguousarray(frame, dtype=self.dtype).tobytes())
+        self.header["steps"] += 1
+        write_header(self.f, self.header)
+        self.f.flush()
+
+    def close(self):
+        if not self.f.closed:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FloodStore:
+    """
+    Leniwy odczyt pliku wyników - zachowuje się jak lista klatek:
+        len(store), store[i], store[-1]
+    Klatki czytane są z dysku przez np.memmap dopiero przy dostępie.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        self.dtype = np.dtype(self.header["dtype"])
+        self.shape = tuple(self.header["shape"])
+        self.transform = self.header["transform"]
+        self.window = self.header["window"]
+        self.downsample = self.header["downsample"]
+        self.dt_seconds = self.header["dt_seconds"]
+        self.frames = np.memmap(
+            path, dtype=self.dtype, mode="r", offset=HEADER_SIZE,
+            shape=(self.header["steps"],) + self.shape,
+        )
+
+    def __len__(self):
+        return self.frames.shape[0]
+
+    def __getitem__(self, step):
+        """Klatka o numerze `step` jako macierz float32 (ujemne indeksy jak w liście)."""
+        return np.asarray(self.frames[step], dtype=np.float32)
+
+
+def convert_npy_folder(folder_path, path, **kwargs):
+    """Przepisuje stare wyniki (pliki *_<krok>.npy w folderze) do jednego pliku wyników."""
+    files = sorted(
+        [f for f in os.listdir(folder_path) if f.endswith(".npy")],
+        key=lambda x: int(x.split("_")[-1].split(".")[0])
+    )
+    writer = None
+    for f in files:
+        frame = np.load(os.path.join(folder_path, f))
+        if writer is None:
+            writer = FloodStoreWriter(path, frame.shape, **kwargs)
+        writer.append(frame)
+    if writer is not None:
+        writer.close()
+    return path
@@ -0,0 +1,132 @@
+"""
+Uproszczony model przepływu powierzchniowego (sam krok przepływu - tylko numpy, bez wykresów i GIS).
+Dla każdej komórki siatki obliczamy różnicę poziomów wody - wysokość terenu + aktualna wysokość
+słupa wody względem sąsiadów. Nadmiar wody spływa do niżej osadzonych komórek.
+
+Paramtery: 
+height: np.array      - Dwuwymiarowa macierz (N x M) opisująca wysokość terenu w metrach.
+water: np.array       - Macierz o tych samych wymiarach zwracająca poziom słupa wody.
+k : float             - Określa, jaka część różnicy wysokości jest przenoszona do sąsiadów
+                        w jednym kroku czasowym.
+
+Zwraca:
+np.ndarray            - Zaktualizowana macierz `water` po jednym kroku czasowym symulacji
+
+Zasada przeplywu:
+ 1. Całkowity poziom wody w komórce:
+       z(i,j) = height(i,j) + water(i,j)
+2. Różnica względem sąsiadów (8-kierunkowych):
+       Δz = z(i,j) - z(m,n)
+3. Przepływ możliwy tylko tam, gdzie Δz > 0.
+       Q(i,j→m,n) = k * max(0, Δz)
+4. Suma odpływów z komórki = suma dopływów do sąsiadów
+"""
+import numpy as np
+
+# , rain: float= 0.0 - usuniety argument
+def flood_step_loop(height: np.ndarray, water: np.ndarray, k: float, roads_mask) -> np.ndarray:
+    """
+    Referencyjna (pętlowa) wersja kroku przepływu - komórka po komórce, okno 3x3.
+    Wolna, ale prosta do sprawdzenia - służy do porównań z wersją wektorową.
+    """
+    total_level = height + water
+    new_water = water.copy()
+
+    for i in range(1, height.shape[0] - 1):
+        for j in range(1, height.shape[1] - 1):
+            neighbors = total_level[i-1:i+2, j-1:j+2]
+            diff = total_level[i, j] - neighbors
+
+            # przepływ tylko w dół (Δz > 0)
+            flow = np.clip(diff, 0, None)
+
+            # sumujemy wypływy, pomijając środkową komórkę
+            flow_sum = flow.sum() - flow[1,1]
+
+            if flow_sum > 0 and water[i,j] > 0:
+                # współczynnik przepływu (drogi szybciej)
+                local_k = k * (2.0 if roads_mask[i,j] else 1.0)
+
+                # normalizacja – rozdzielamy proporcjonalnie
+                flow_norm = flow / flow_sum
+
+                # ile wody wypływa z tej komórki
+                outflow = local_k * water[i,j]
+
+                # aktualizacja
+                new_water[i,j] -= outflow
+                new_water[i-1:i+2, j-1:j+2] += flow_norm * outflow
+    return np.clip(new_water,0,None)
+
+
+# przesunięcia 8 sąsiadów (di, dj) - bez środkowej komórki
+NEIGHBOR_OFFSETS = [(di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1) if (di, dj) != (0, 0)]
+
+
+def flood_delta(height: np.ndarray, water: np.ndarray, k: float, roads_mask) -> np.ndarray:
+    """
+    Zmiana słupa wody w jednym kroku przepływu (dopływy - odpływy), bez obcinania do zera.
+    Ta sama reguła co w flood_step_loop, liczona na całych macierzach zamiast komórka po komórce.
+
+    Dla każdego z 8 kierunków bierzemy przesunięty widok poziomu wody, liczymy
+    dodatnie spadki dla wszystkich komórek wewnętrznych naraz, a potem
+    rozrzucamy odpływ do sąsiadów dodając go do przesuniętych wycinków wyniku.
+    Odpływ liczony jest ze starego `water`, więc kolejność nie ma znaczenia.
+    Komórki brzegowe nie oddają wody - przyjmują tylko dopływ od sąsiadów.
+    """
+    nrows, ncols = height.shape
+    delta = np.zeros(water.shape, dtype=float)
+    if nrows < 3 or ncols < 3:
+        return delta
+
+    total_level = height + water
+    # komórki wewnętrzne (bez brzegu, jak w pętli)
+    center = total_level[1:-1, 1:-1]
+
+    # spadki do każdego z sąsiadów
+    flows = []
+    for di, dj in NEIGHBOR_OFFSETS:
+        neighbor = total_level[1 + di:nrows - 1 + di, 1 + dj:ncols - 1 + dj]
+        flows.append(np.clip(center - neighbor, 0, None))
+    flow_sum = np.sum(flows, axis=0)
+
+    water_inner = water[1:-1, 1:-1]
+    active = (flow_sum > 0) & (water_inner > 0)
+
+    # współczynnik przepływu (drogi szybciej)
+    local_k = np.where(roads_mask[1:-1, 1:-1], 2.0 * k, k)
+
+    # ile wody wypływa z każdej komórki
+    outflow = np.where(active, local_k * water_inner, 0.0)
+    # odpływ na jednostkę spadku - 0 tam, gdzie nie ma przepływu
+    share = np.divide(outflow, flow_sum, out=np.zeros_like(outflow), where=active)
+
+    delta[1:-1, 1:-1] -= outflow
+    for (di, dj), flow in zip(NEIGHBOR_OFFSETS, flows):
+        delta[1 + di:nrows - 1 + di, 1 + dj:ncols - 1 + dj] += flow * share
+    return delta
+
+
+def flood_step_numpy(height: np.ndarray, water: np.ndarray, k: float, roads_mask) -> np.ndarray:
+    """
+    Wektorowa wersja kroku przepływu - wynik zgadza się z flood_step_loop
+    z dokładnością do zaokrągleń.
+    """
+    return np.clip(water + flood_delta(height, water, k, roads_mask), 0, None)
+
+
+FLOOD_BACKENDS = {
+    "loop": flood_step_loop,
+    "numpy": flood_step_numpy,
+}
+
+
+def flood_step(height: np.ndarray, water: np.ndarray, k: float, roads_mask, backend: str = "numpy") -> np.ndarray:
+    """
+    Jeden krok przepływu powierzchniowego (patrz opis modelu wyżej).
+
+    backend: str          - "numpy" (domyślnie, wektorowo) albo "loop" (wersja referencyjna)
+    """
+    if backend not in FLOOD_BACKENDS:
+        raise ValueError(f"Nieznany backend flood_step: {backend!r}, dostępne: {list(FLOOD_BACKENDS)}")
+    return FLOOD_BACKENDS[backend](height, water, k, roads_mask)
@@ -0,0 +1,107 @@
+import numpy as np
+
+from flood_agent.model.flow import flood_step
+
+# scenariusz odwzorowuje realne sumy opadów z powodzi 2010 w Krakowie (≈141 mm): (godziny, mm/h)
+RAIN_BLOCKS_2010 = [
+    (6, 6),    # 6 h po 6 mm/h - front pierwszy
+    (12, 3),   # 12 h po 3 mm/h - dlugotrwaly deszcz
+    (3, 15),   # 3 h po 15 mm/h - najsilniejsze opady -> podtopienia
+    (6, 4),    # 6 h po 4 mm/h - schodzenie
+]
+
+
+def rain_series_from_blocks(rain_blocks, dt_seconds):
+    """
+    Seria opadu na iterację [m słupa wody] z bloków (godziny, mm/h) dla kroku dt_seconds.
+    """
+    dt_hours = dt_seconds / 3600.0
+    series = []
+    for hours, mmph in rain_blocks:
+        steps = int(np.ceil(hours / dt_hours))
+        series.extend([(mmph / 1000.0) * dt_hours] * steps)  # mm->m razy czas kroku
+    return series
+
+
+class Hydrology:
+    """
+    Stan modelu przepływu przesuwany iteracja po iteracji - ta sama logika co pętla
+    w model.py (deszcz w każdej iteracji, przepływ co `flow_interval` iteracji,
+    jednorazowe przelanie wałów Wisły), ale bez zapisu klatek na dysk.
+
+    Obiekt może należeć do modelu agentowego (TestModel(hydrology=...)), który przesuwa go
+    razem z agentami. Woda jest dostępna w `water`; add_water pozwala zmieniać
+    ją w trakcie symulacji (np. pompowanie, zmiana scenariusza).
+
+    Paramtery:
+    height: np.array       - wysokość terenu (wycinek DEM) [m]
+    roads_mask: np.array   - maska dróg (szybszy przepływ)
+    river_mask: np.array   - maska koryta Wisły (stan początkowy i przelanie)
+    rain_series: list      - opad na iterację [m]; po końcu serii opad = 0
+    dt_seconds: float      - czas jednej iteracji [s]
+    """
+
+    def __init__(self, height, roads_mask, river_mask, rain_series, dt_seconds=600.0, k=0.15, k_overflow=0.25,
+                 flow_interval=5, river_depth=0.5, overflow_level=1.5, overflow_surge=0.4, water=None,
+                 backend="numpy"):
+        self.height = height
+        self.roads_mask = roads_mask
+        self.river_mask = river_mask
+        self.rain_series = list(rain_series)
+        self.dt_seconds = dt_seconds
+        self.k = k
+        self.k_overflow = k_overflow
+        self.flow_interval = flow_interval
+        self.overflow_level = overflow_level
+        self.overflow_surge = overflow_surge
+        self.backend = backend
+
+        if water is None:
+            water = np.zeros_like(height, dtype=float)
+            water[river_mask] = river_depth  # startowy poziom rzeki
+        self.water = np.array(water, dtype=float)
+
+        self.iteration = 0              # liczba wykonanych iteracji
+        self.overflow_iteration = None  # iteracja, w której Wisła przelała wały
+
+    @property
+    def simulated_seconds(self):
+        return self.iteration * self.dt_seconds
+
+    def rain_at(self, t):
+        return self.rain_series[t] if t < len(self.rain_series) else 0.0
+
+    def step(self):
+        """Jedna iteracja: deszcz, przepływ (co flow_interval iteracji), sprawdzenie przelania."""
+        t = self.iteration
+        self.water += self.rain_at(t)
+
+        if t % self.flow_interval == 0:
+            self.water = flood_step(self.height, self.water, k=self.k, roads_mask=self.roads_mask, backend=self.backend)
+
+        self.check_overflow(t)
+
+        self.iteration += 1
+        return self.water
+
+    def check_overflow(self, t):
+        """Jednorazowe przelanie wałów, gdy poziom w korycie przekroczy overflow_level (t - numer iteracji)."""
+        if self.overflow_iteration is None and self.river_mask.any() \
+                and np.max(self.water[self.river_mask]) > self.overflow_level:
+            # zwiększamy przepływ globalnie - wisla pcha szybciej wode
+            self.k = self.k_overflow
+            # piksele sąsiadujące z river_mask - nagły przybór w okolicy wałów
+            from scipy.ndimage import binary_dilation
+            ring = binary_dilation(self.river_mask) & (~self.river_mask)
+            self.water[ring] += self.overflow_surge
+            self.overflow_iteration = t
+
+    def advance_to(self, iteration):
+        """Wykonuje iteracje aż do osiągnięcia `iteration` wykonanych iteracji."""
+        while self.iteration < iteration:
+            self.step()
+        return self.water
+
+    def add_water(self, mask, depth):
+        """Dodaje (depth > 0) albo usuwa (depth < 0) wodę w komórkach maski; poziom nie spada poniżej zera."""
+        self.water[mask] = np.clip(self.water[mask] + depth, 0, None)
@@ -5,263 +5,147 @@ import rasterio
 from rasterio.merge import merge
 import glob
 from rasterio.transform import rowcol, xy
-import geopandas as gpd
-import osmnx as ox
 from rasterio.features import rasterize
 from shapely.geometry import box
 from pyproj import Transformer
 from shapely.ops import transform as shp_transform
+from rasterio.transform import Affine
+from flood_agent.model.flood_store import FloodStoreWriter
+# krok przepływu w osobnym module bez zależności (flow.py); nazwy zostają dostępne także stąd
+from flood_agent.model.flow import FLOOD_BACKENDS, NEIGHBOR_OFFSETS, flood_delta, flood_step, flood_step_loop, \
+    flood_step_numpy
 
-"""
-Uproszczony model przepływu powierzchniowego.
-Dla każdej komórki siatki obliczamy różnicę poziomów wody - wysokość terenu + aktualna wysokość
-słupa wody względem sąsiadów. Nadmiar wody spływa do niżej osadzonych komórek.
+if __name__ == "__main__":
+    from flood_agent.model.hydrology import RAIN_BLOCKS_2010, Hydrology, rain_series_from_blocks
+    from flood_agent.model.terrain import STUDY_FACTOR, STUDY_WINDOW, raster_info, read_window, sampling_transform
+    from flood_agent.model.osm_cache import OSMCache
 
-Paramtery: 
-height: np.array      - Dwuwymiarowa macierz (N x M) opisująca wysokość terenu w metrach.
-water: np.array       - Macierz o tych samych wymiarach zwracająca poziom słupa wody.
-k : float             - Określa, jaka część różnicy wysokości jest przenoszona do sąsiadów
-                        w jednym kroku czasowym.
+    # polaczenie ze soba pobranych obszarow tiff
+    tiffs = glob.glob("dem/*.tiff")
+    src_files_to_mosaic = []
+    for fp in tiffs:
+        src = rasterio.open(fp)
+        src_files_to_mosaic.append(src)
 
-Zwraca:
-np.ndarray            - Zaktualizowana macierz `water` po jednym kroku czasowym symulacji
+    mosaic, out_transform = merge(src_files_to_mosaic)
 
-Zasada przeplywu:
- 1. Całkowity poziom wody w komórce:
-       z(i,j) = height(i,j) + water(i,j)
-2. Różnica względem sąsiadów (8-kierunkowych):
-       Δz = z(i,j) - z(m,n)
-3. Przepływ możliwy tylko tam, gdzie Δz > 0.
-       Q(i,j→m,n) = k * max(0, Δz)
-4. Suma odpływów z komórki = suma dopływów do sąsiadów
-"""
+    out_meta = src.meta.copy()
+    out_meta.update({
+        "driver": "GTiff",
+        "height": mosaic.shape[1],
+        "width": mosaic.shape[2],
+        "transform": out_transform
+    })
 
-# , rain: float= 0.0 - usuniety argument
-def flood_step(height: np.ndarray, water: np.ndarray, k: float, roads_mask) -> np.ndarray:
-    total_level = height + water
-    new_water = water.copy()
+    # zapis połączonego DEM
+    # with rasterio.open("krakow_merged.tif", "w", **out_meta) as dest:
+    #     dest.write(mosaic)
 
-    for i in range(1, height.shape[0] - 1):
-        for j in range(1, height.shape[1] - 1):
-            neighbors = total_level[i-1:i+2, j-1:j+2]
-            diff = total_level[i, j] - neighbors
 
-            # przepływ tylko w dół (Δz > 0)
-            flow = np.clip(diff, 0, None)
+    # same metadane pełnego DEM - dane czytamy tylko dla wycinka
+    transform, raster_crs, _ = raster_info("krakow_merged.tif")  # do późniejszego odczytu piksel_size
+    pix_size_x = abs(transform.a)   # [m/pixel]
+    pix_size_y = abs(transform.e)
 
-            # sumujemy wypływy, pomijając środkową komórkę
-            flow_sum = flow.sum() - flow[1,1]
+    #obszar rynku (wiersze 2000:3200, kolumny 3500:4800, co 6. komórka) - okno z cache na dysku
+    rynek, rynek_transform = read_window("krakow_merged.tif", STUDY_WINDOW, STUDY_FACTOR)
+    # siatka do rasteryzacji masek od razu w rozdzielczości rynku
+    mask_transform = sampling_transform(rynek_transform, STUDY_FACTOR)
 
-            if flow_sum > 0 and water[i,j] > 0:
-                # współczynnik przepływu (drogi szybciej)
-                local_k = k * (2.0 if roads_mask[i,j] else 1.0)
+    # ------------------ area drog --------------------------------------------------------
 
-                # normalizacja – rozdzielamy proporcjonalnie
-                flow_norm = flow / flow_sum
+    r0, r1 = 1400, 2600
+    c0, c1 = 3800, 5000
 
-                # ile wody wypływa z tej komórki
-                outflow = local_k * water[i,j]
+    # współrzędne geograficzne tego obszaru
+    x_min, y_max = xy(transform, r0, c0)
+    x_max, y_min = xy(transform, r1, c1)
 
-                # aktualizacja
-                new_water[i,j] -= outflow
-                new_water[i-1:i+2, j-1:j+2] += flow_norm * outflow
-    return np.clip(new_water,0,None)
 
-# polaczenie ze soba pobranych obszarow tiff
-tiffs = glob.glob("dem/*.tiff")
-src_files_to_mosaic = []
-for fp in tiffs:
-    src = rasterio.open(fp)
-    src_files_to_mosaic.append(src)
+    # pobieramy bounding box w DEM CRS
+    bbox_poly = box(x_min, y_min, x_max, y_max)
 
-mosaic, out_transform = merge(src_files_to_mosaic)
+    # pobieramy drogi w WGS84
+    to_wgs84 = Transformer.from_crs(raster_crs, "EPSG:4326", always_xy=True).transform
+    bbox_poly_wgs = shp_transform(to_wgs84, bbox_poly)
 
-out_meta = src.meta.copy()
-out_meta.update({
-    "driver": "GTiff",
-    "height": mosaic.shape[1],
-    "width": mosaic.shape[2],
-    "transform": out_transform
-})
+    # maski dróg i Wisły z cache na dysku (Data/osm_cache) - OSM pobierany tylko przy pierwszym uruchomieniu
+    # albo po zmianie obszaru / tagów / bufora / siatki
+    osm = OSMCache()
 
-# zapis połączonego DEM
-# with rasterio.open("krakow_merged.tif", "w", **out_meta) as dest:
-#     dest.write(mosaic)
+    # drogi z buforem 5 m, rasteryzowane od razu na siatce rynku (ten sam wynik co pełny DEM + wycinek + [::6, ::6])
+    roads_mask = osm.feature_mask(bbox_poly_wgs, {"highway": True}, raster_crs, rynek.shape, mask_transform,
+                                  buffer=5)
 
+    # ------------------ koniec area drog ---------------------------------------------
 
-with rasterio.open("krakow_merged.tif") as src:
-    height = src.read(1)
-    transform = src.transform   # do późniejszego odczytu piksel_size
-    pix_size_x = abs(transform[0])   # [m/pixel]
-    pix_size_y = abs(transform[4]) 
-
-    raster_crs = src.crs
-   
+    # ------------------ area maski wisly ---------------------------------------------
+    # tylko Wisła (Vistula) - nie chcemy załapania się innej rzeki; jeśli pusto - {"water": "river"}
+    # bufor 30 m, bo linia rzeki ma szerokość (można dać 20, 30 itd do zmian)
+    river_mask = osm.feature_mask(bbox_poly_wgs, {"waterway": "river"}, raster_crs, rynek.shape, mask_transform,
+                                  buffer=30, name_contains=("Wis", "Vist"), fallback_tags={"water": "river"})
 
-#obszar rynku 
-rynek = height[2000:3200, 3500:4800]
-rynek = rynek[::6, ::6]
-
-water = np.zeros_like(rynek, dtype=float)
-
-# ------------------ area drog --------------------------------------------------------
+    # ----------------- koniec maski wisly ------------------------------------------
 
-r0, r1 = 1400, 2600
-c0, c1 = 3800, 5000
-
-# współrzędne geograficzne tego obszaru
-x_min, y_max = xy(transform, r0, c0)
-x_max, y_min = xy(transform, r1, c1)
-
-
-# pobieramy bounding box w DEM CRS
-bbox_poly = box(x_min, y_min, x_max, y_max)
-
-# pobieramy drogi w WGS84
-to_wgs84 = Transformer.from_crs(raster_crs, "EPSG:4326", always_xy=True).transform
-bbox_poly_wgs = shp_transform(to_wgs84, bbox_poly)
-
-gdf_roads = ox.features_from_polygon(bbox_poly_wgs, {"highway": True})
-
-# projekcja dróg do CRS DEM
-roads = gdf_roads.to_crs(raster_crs)
-roads["geometry"] = roads.buffer(5)
-
-# rasteryzacja dróg na pełny DEM 
-roads_raster_full = rasterize(
-    [(geom, 1) for geom in roads.geometry],
-    out_shape=height.shape,
-    transform=transform,
-    fill=0
-)
-
-# wycinek jak dla rynku - wazne - do zmiany gdy zmienia sie obszar height
-roads_rynek = roads_raster_full[2000:3200, 3500:4800]
-
-# downsampling taki jak przy glownym obszarze
-roads_rynek = roads_rynek[::6, ::6]
-
-# ------------------ koniec area drog ---------------------------------------------
-roads_mask = roads_rynek.astype(bool)
-
-# ------------------ area maski wisly ---------------------------------------------
-# pobieram wisle
-gdf_river = ox.features_from_polygon(bbox_poly_wgs, {"waterway": "river"})
-
-# filtr tylko wisla - nie chcemy zalapania sie innej rzeki - Vistula
-gdf_river = gdf_river[
-    gdf_river.get("name", "").str.contains("Wis", case=False, na=False) |
-    gdf_river.get("name", "").str.contains("Vist", case=False, na=False)
-]
-
-# jeśli pusta 
-if gdf_river.empty:
-    gdf_river = ox.features_from_polygon(bbox_poly_wgs, {"water": "river"})
-
-# projekcja do CRS DEM
-river = gdf_river.to_crs(raster_crs)
-
-# bufor – bo linia rzeki ma szerokość
-river["geometry"] = river.buffer(30)  # 15 m – można dać 20, 30 itd do zmian
-
-river_raster_full = rasterize(
-    [(geom, 1) for geom in river.geometry],
-    out_shape=height.shape,
-    transform=transform,
-    fill=0
-)
+    # dodajemy opady 
+    dt_seconds = 600.0  # co 10 min
 
-# wycinek rynku
-river_rynek = river_raster_full[2000:3200, 3500:4800]
-river_rynek = river_rynek[::6, ::6]
+    # seria intensywnosci per iteracja (bloki z powodzi 2010)
+    rain_series = rain_series_from_blocks(RAIN_BLOCKS_2010, dt_seconds)
 
-# maska wisły
-river_mask = river_rynek.astype(bool)
-
-# startowy poziom rzeki
-water[river_mask] = 0.50  # 50 cm wody w korycie na starcie
-# ----------------- koniec maski wisly ------------------------------------------
+    total_mm = sum(h*mmph for h, mmph in RAIN_BLOCKS_2010)
+    print(f"Łączny opad scenariusza ≈ {total_mm} mm")
 
-# dodajemy opady 
-dt_seconds = 600.0  # co 10 min
-dt_hours = dt_seconds / 3600.0
+    # stan przepływu: startowy poziom rzeki 50 cm, k = 0.15 -> 0.25 po przelaniu
+    hydrology = Hydrology(rynek, roads_mask, river_mask, rain_series, dt_seconds=dt_seconds)
 
-# funkcja mm/h -> metry slupa wody dodane w 1 iteracji 
-def mmph_to_m_per_iteration(mm_per_hour: float)->float:
-    return (mm_per_hour / 1000.0)*dt_hours # czyli mm->m i mnozymy przez czas kroku
-
-# scenariusz odwzorowuje realne sumy opadów z powodzi 2010 w Krakowie mamy ≈141 mm
-rain_block = [
-    (6,6), # 6 h po 6mm/h - front pierwszy
-    (12,3), # 12 h po 3 mm/h - dlugotrwaly deszcz
-    (3,15), # 3h po 15 mm/h - najsilniejsze opady -> podtopienia
-    (6,4) # 6h po 4 mm/h - schodzenie
-]
+    # zapis wyników - jeden plik z kolejnymi klatkami wody (odczyt w evac_model przez FloodStore)
+    flood_store = FloodStoreWriter(
+        "Data/flood_run.flood",
+        shape=rynek.shape,
+        transform=rynek_transform,
+        window=STUDY_WINDOW,
+        downsample=STUDY_FACTOR,
+        dt_seconds=dt_seconds,
+    )
 
-rain_series = [] #seria intensywnosci per iteracja 
-for hours, mmph in rain_block:
-    steps = int(np.ceil(hours / dt_hours))
-    rain_series.extend([mmph_to_m_per_iteration(mmph)] * steps)
+    plt.figure(figsize=(10,6))
+    for t in range(len(rain_series)):
 
-total_mm = sum(h*mmph for h, mmph in rain_block)
-print(f"Łączny opad scenariusza ≈ {total_mm} mm")
-
-k = 0.15 # startowo 
-overflow_triggered = False  # sygnał czy już było przelanie
-plt.figure(figsize=(10,6))
-for t, rain_m in enumerate(rain_series):
-
-    # deszcz
-    water += rain_m
-
-    # przepływ co X kroków
-    if t % 5 == 0:
-        water = flood_step(rynek, water, k=k, roads_mask=roads_mask)
-        print(f"{t}: max={np.max(water):.3f} m, mean={np.mean(water):.3f} m")
-
-    # sprawdzamy overflow wisly
-    if (not overflow_triggered) and (np.max(water[river_mask]) > 1.5):
-        print(f"*** UWAGA: Wisła PRZELAŁA WAŁY! (krok={t}, czas={t*10} minut) ***")
-        
-        # zwiększamy przepływ globalnie - wisla pcha szybciej wode
-        k = 0.25
-        
-        # efekt gwałtownego wylania
-        # water[rzeka sąsiadująca] += 0.4 m
-    
-        # piksele sąsiadujące z river_mask
-        from scipy.ndimage import binary_dilation
-        ring = binary_dilation(river_mask) & (~river_mask)
-        water[ring] += 0.4  # 40 cm nagle w okolicy wałów
-        
-        overflow_triggered = True
-
-    # animacja co 20 kroków
-    if t % 20 == 0:
-        plt.clf()
-
-        #plt.imshow(roads_rynek, cmap="binary", alpha=0.18, origin="upper")
-        plt.imshow(roads_rynek, cmap="gray", alpha=0.3)
-        plt.contour(roads_rynek, levels=[0.5], colors='black', linewidths=0.5)
-
-        # terrain
-        im1 = plt.imshow(rynek, cmap='terrain', origin='upper')
-
-        # water overlay
-        im2 = plt.imshow(water, cmap='Blues', alpha=0.65, origin='upper')
-
-        # legenda 1 (wysokość terenu)
-        cbar1 = plt.colorbar(im1, fraction=0.046, pad=0.04)
-        cbar1.set_label("Wysokość terenu [m n.p.m.]")
-
-        # legenda 2 (głębokość wody)
-        cbar2 = plt.colorbar(im2, fraction=0.046, pad=0.12)
-        cbar2.set_label("Głębokość wody [m]")
-
-        plt.title(f"Deszcz + spływ powierzchniowy — krok {t}")
-        plt.pause(0.5)
-plt.tight_layout()
-plt.show()
+        # deszcz + przepływ + przelanie wałów do końca tej iteracji (t + 1) * dt_seconds
+        water = hydrology.advance_to(t + 1)
+        if t % hydrology.flow_interval == 0:
+            print(f"{t}: max={np.max(water):.3f} m, mean={np.mean(water):.3f} m")
 
+        if hydrology.overflow_iteration == t:
+            print(f"*** UWAGA: Wisła PRZELAŁA WAŁY! (krok={t}, czas={t*10} minut) ***")
 
+        # klatka wody po tej iteracji
+        flood_store.append(water)
 
+        # animacja co 20 kroków
+        if t % 20 == 0:
+            plt.clf()
+
+            plt.imshow(roads_mask, cmap="gray", alpha=0.3)
+            plt.contour(roads_mask, levels=[0.5], colors='black', linewidths=0.5)
+
+            # terrain
+            im1 = plt.imshow(rynek, cmap='terrain', origin='upper')
+
+            # water overlay
+            im2 = plt.imshow(water, cmap='Blues', alpha=0.65, origin='upper')
+
+            # legenda 1 (wysokość terenu)
+            cbar1 = plt.colorbar(im1, fraction=0.046, pad=0.04)
+            cbar1.set_label("Wysokość terenu [m n.p.m.]")
+
+            # legenda 2 (głębokość wody)
+            cbar2 = plt.colorbar(im2, fraction=0.046, pad=0.12)
+            cbar2.set_label("Głębokość wody [m]")
+
+            plt.title(f"Deszcz + spływ powierzchniowy — krok {t}")
+            plt.pause(0.5)
+    flood_store.close()
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,217 @@
+import os
+import json
+import pickle
+import hashlib
+
+import numpy as np
+import networkx as nx
+from rasterio.features import rasterize
+from shapely import wkt
+
+from flood_agent.model.flood_store import affine_coefficients
+
+# domyślny katalog z pobranymi / przetworzonymi danymi OSM (względem katalogu głównego)
+DEFAULT_CACHE_DIR = "Data/osm_cache"
+
+
+class OsmnxProvider:
+    """Źródło danych prosto z OpenStreetMap przez osmnx (wymaga sieci)."""
+
+    name = "osmnx"
+
+    def features(self, polygon_wgs, tags):
+        import osmnx as ox
+        return ox.features_from_polygon(polygon_wgs, tags)
+
+    def graph(self, bbox_wgs, network_type):
+        import osmnx as ox
+        return ox.graph_from_bbox(bbox_wgs, network_type=network_type)
+
+
+class FixtureProvider:
+    """
+    Źródło danych podstawione zamiast OSM - testy, praca offline, dane z innego źródła.
+
+    features: {klucz tagu: GeoDataFrame w EPSG:4326}, np. {"highway": gdf_drog, "waterway": gdf_rzek};
+              zapytanie {"waterway": "river"} zwraca wiersze gdf["waterway"] == "river"
+              (tag True - wszystkie wiersze), przycięte do wielokąta zapytania
+    graphs: {network_type: MultiDiGraph jak z osmnx} - z G.graph["crs"] i atrybutami x, y (lon/lat) węzłów
+    """
+
+    name = "fixture"
+
+    def __init__(self, features=None, graphs=None):
+        self.feature_sets = dict(features or {})
+        self.graphs = dict(graphs or {})
+
+    def features(self, polygon_wgs, tags):
+        import geopandas as gpd
+        for key, value in tags.items():
+            if key not in self.feature_sets:
+                continue
+            gdf = self.feature_sets[key]
+            if value is not True and key in gdf.columns:
+                values = value if isinstance(value, (list, tuple)) else [value]
+                gdf = gdf[gdf[key].isin(values)]
+            return gdf[gdf.intersects(polygon_wgs)].copy()
+        return gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
+
+    def graph(self, bbox_wgs, network_type):
+        return self.graphs[network_type].copy()
+
+
+_provider = OsmnxProvider()
+
+
+def get_provider():
+    return _provider
+
+
+def set_provider(provider):
+    """Ustawia domyślne źródło danych dla OSMCache bez jawnego provider; zwraca poprzednie."""
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
+
+
+def cache_key(kind, **params):
+    """Klucz artefaktu (JSON) z rodzaju i parametrów zapytania."""
+    return json.dumps({"kind": kind, **params}, sort_keys=True, default=str)
+
+
+class OSMCache:
+    """
+    Maski rastrowe i grafy wyprowadzone z OSM zapisywane na dysku, żeby kolejne uruchomienia
+    (model powodzi, budowa grafu, eksperymenty) nie pobierały danych z sieci ani nie
+    rasteryzowały ich od nowa.
+
+    Klucz artefaktu: źródło danych (provider.name), wielokąt / bbox zapytania, tagi, bufor,
+    filtr nazw, CRS i siatka rastra (shape + transform). Zmiana któregokolwiek parametru
+    daje nowy plik; refresh=True wymusza ponowne pobranie, offline=True zgłasza błąd zamiast
+    sięgać do źródła przy braku artefaktu.
+
+    cache_dir: str     - katalog artefaktów (maski .npz, grafy .pickle)
+    provider           - źródło danych (OsmnxProvider, FixtureProvider, ...); domyślnie get_provider()
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, provider=None, refresh=False, offline=False):
+        self.cache_dir = cache_dir
+        self.provider = provider
+        self.refresh = refresh
+        self.offline = offline
+
+    @property
+    def source(self):
+        return self.provider if self.provider is not None else get_provider()
+
+    def path_for(self, key, ext):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest()[:16] + ext)
+
+    def _check_fetch(self, path):
+        if self.offline:
+            raise FileNotFoundError(f"Brak artefaktu OSM w cache (tryb offline): {path}")
+
+    def _load_mask(self, path, key):
+        if self.refresh or not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if str(data["key"]) != key:
+                return None
+            return data["mask"]
+
+    def _save(self, path, write):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def _load_graph(self, path, key):
+        if self.refresh or not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            stored_key, G = pickle.load(f)
+        return G if stored_key == key else None
+
+    def _save_graph(self, path, key, G):
+        self._save(path, lambda f: pickle.dump((key, G), f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def feature_mask(self, polygon_wgs, tags, crs, out_shape, transform, buffer=0.0, name_contains=None,
+                     fallback_tags=None):
+        """
+        Maska (bool, out_shape) obiektów OSM o tagach `tags` w wielokącie polygon_wgs (EPSG:4326),
+        po rzutowaniu do `crs` i buforze `buffer` [m], zrasteryzowana na siatce `transform`.
+
+        name_contains: podciągi nazwy (bez rozróżniania wielkości liter) - zostają tylko pasujące obiekty
+        fallback_tags: tagi zapytania, gdy po filtrze nic nie zostało (bez filtra nazw)
+        """
+        key = cache_key("mask", provider=self.source.name, polygon=wkt.dumps(polygon_wgs, rounding_precision=9),
+                        tags=tags, fallback_tags=fallback_tags, name_contains=name_contains, buffer=buffer,
+                        crs=str(crs), shape=list(out_shape), transform=affine_coefficients(transform))
+        path = self.path_for(key, ".npz")
+        mask = self._load_mask(path, key)
+        if mask is not None:
+            return mask
+        self._check_fetch(path)
+
+        gdf = self.source.features(polygon_wgs, tags)
+        if name_contains and not gdf.empty:
+            match = np.zeros(len(gdf), dtype=bool)
+            if "name" in gdf.columns:
+                names = gdf["name"].astype("string")
+                for part in name_contains:
+                    match |= names.str.contains(part, case=False, na=False).to_numpy(dtype=bool)
+            gdf = gdf[match]
+        if gdf.empty and fallback_tags:
+            gdf = self.source.features(polygon_wgs, fallback_tags)
+
+        mask = np.zeros(tuple(out_shape), dtype=bool)
+        if not gdf.empty:
+            geoms = gdf.to_crs(crs).buffer(buffer) if buffer else gdf.to_crs(crs).geometry
+            mask = rasterize([(geom, 1) for geom in geoms], out_shape=tuple(out_shape), transform=transform,
+                             fill=0).astype(bool)
+
+        self._save(path, lambda f: np.savez_compressed(f, mask=mask, key=np.array(key)))
+        return mask
+
+    def road_graph(self, bbox_wgs, network_type, crs=None):
+        """
+        Graf OSM (MultiDiGraph z osmnx) dla bbox_wgs = (left, bottom, right, top) i typu sieci,
+        rzutowany do `crs` (None - strefa UTM wybrana przez osmnx).
+        """
+        key = cache_key("graph", provider=self.source.name, bbox=[float(v) for v in bbox_wgs],
+                        network_type=network_type, crs=None if crs is None else str(crs))
+        path = self.path_for(key, ".pickle")
+        G = self._load_graph(path, key)
+        if G is not None:
+            return G
+        self._check_fetch(path)
+
+        import osmnx as ox
+        G = ox.project_graph(self.source.graph(tuple(bbox_wgs), network_type), to_crs=crs)
+        self._save_graph(path, key, G)
+        return G
+
+    def merged_graph(self, bbox_wgs, crs=None, network_types=("drive", "walk")):
+        """
+        Nieskierowany graf połączonych sieci (domyślnie drive + walk) jak w create_graph_water:
+        krawędzie z length i safe='yes', węzły z x, y w `crs`. Kolejność węzłów i krawędzi
+        jak przy budowie bez cache (ważne dla powtarzalności symulacji).
+        """
+        key = cache_key("merged", provider=self.source.name, bbox=[float(v) for v in bbox_wgs],
+                        network_types=list(network_types), crs=None if crs is None else str(crs))
+        path = self.path_for(key, ".pickle")
+        G = self._load_graph(path, key)
+        if G is not None:
+            return G
+
+        G = nx.Graph()
+        for network_type in network_types:
+            G_part = self.road_graph(bbox_wgs, network_type, crs)
+            for u, v, data in G_part.edges(data=True):
+                G.add_edge(u, v, length=data.get('length', 1.0), safe='yes')
+            for n, data in G_part.nodes(data=True):
+                G.add_node(n, x=float(data['x']), y=float(data['y']))
+
+        self._save_graph(path, key, G)
+        return G
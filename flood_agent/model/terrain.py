@@ -0,0 +1,75 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.transform import Affine
+from rasterio.windows import Window
+
+from flood_agent.model.flood_store import affine_coefficients
+
+# obszar badań: wiersze 2000:3200, kolumny 3500:4800 krakow_merged.tif, co 6. komórka
+STUDY_WINDOW = (2000, 3200, 3500, 4800)
+STUDY_FACTOR = 6
+
+
+def raster_info(dem_path):
+    """Transformacja, CRS i rozmiar pełnego DEM - bez czytania danych."""
+    with rasterio.open(dem_path) as src:
+        return src.transform, src.crs, src.shape
+
+
+def read_window(dem_path, window=STUDY_WINDOW, factor=STUDY_FACTOR, resampling="nearest", cache_dir=None):
+    """
+    Wycinek DEM (r0, r1, c0, c1) zdecymowany `factor` razy, bez czytania całego rastra.
+    Zwraca (height, transform), gdzie transform opisuje siatkę wyniku jak dotąd
+    (transform DEM * translation(c0, r0) * scale(factor)).
+
+    resampling="nearest" daje dokładnie to samo co height[r0:r1, c0:c1][::factor, ::factor]:
+    okno przesunięte o factor // 2 piksela sprawia, że środek każdej komórki wyniku wypada
+    na pikselu r0 + factor * i. Inne metody (np. "average") uśredniają bloki factor x factor.
+
+    Wynik zapisywany jest w cache_dir (domyślnie terrain_cache obok DEM) pod kluczem
+    z okna, współczynnika, metody i rozmiaru / daty modyfikacji pliku DEM.
+    """
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(dem_path)), "terrain_cache")
+    stat = os.stat(dem_path)
+    key = json.dumps({"dem": os.path.abspath(dem_path), "size": stat.st_size, "mtime": stat.st_mtime_ns,
+                      "window": list(window), "factor": factor, "resampling": resampling})
+    cache_path = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest()[:16] + ".npz")
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as data:
+            return data["height"], Affine(*data["transform"])
+
+    r0, r1, c0, c1 = window
+    out_shape = (-(-(r1 - r0) // factor), -(-(c1 - c0) // factor))
+    shift = factor // 2 if resampling == "nearest" else 0
+    with rasterio.open(dem_path) as src:
+        src_window = Window(c0 - shift, r0 - shift, out_shape[1] * factor, out_shape[0] * factor)
+        inside = (r0 - shift >= 0 and c0 - shift >= 0
+                  and r0 - shift + out_shape[0] * factor <= src.height
+                  and c0 - shift + out_shape[1] * factor <= src.width)
+        if inside:
+            height = src.read(1, window=src_window, out_shape=out_shape, resampling=Resampling[resampling])
+        else:
+            # okno wychodzi poza raster - czytamy sam wycinek i decymujemy co factor
+            height = src.read(1, window=Window(c0, r0, c1 - c0, r1 - r0))[::factor, ::factor]
+        transform = src.transform * Affine.translation(c0, r0) * Affine.scale(factor, factor)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + ".tmp.npz"
+    np.savez(tmp_path, height=height, transform=np.array(affine_coefficients(transform)))
+    os.replace(tmp_path, cache_path)
+    return height, transform
+
+
+def sampling_transform(transform, factor):
+    """
+    Siatka o środkach komórek w środkach próbkowanych pikseli (r0 + factor * i) - do rasteryzacji
+    masek (drogi, rzeka) od razu w rozdzielczości wycinka, z tym samym wynikiem co rasteryzacja
+    na pełnym DEM i decymacja [::factor, ::factor].
+    """
+    offset = (1.0 - factor) / (2.0 * factor)
+    return transform * Affine.translation(offset, offset)
@@ -0,0 +1,277 @@
+import os
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from flood_agent.model.flow import flood_delta, flood_step
+
+"""
+Kafelkowy, wieloprocesowy solver przepływu dla dużych DEM (cały Kraków w natywnej rozdzielczości).
+
+DEM dzielimy na prostokątne kafelki. Każdy kafelek liczony jest na oknie poszerzonym
+o jedną komórkę halo z każdej strony (przycięte do brzegu mapy):
+ 1. faza "delta"  - dla komórek własnych kafelka liczymy odpływy (flood_delta na oknie);
+                    woda oddana sąsiadom spoza kafelka ląduje w pierścieniu halo.
+ 2. faza "halo"   - wymiana halo: każdy kafelek dodaje do swoich komórek własną deltę
+                    oraz wkłady z pierścieni halo sąsiednich kafelków i obcina wynik do zera.
+Komórki halo nie oddają wody (leżą na brzegu okna), więc każdy odpływ liczony jest
+dokładnie raz - wynik zgadza się z flood_step na całej mapie.
+
+Wysokość terenu, maska dróg, dwa bufory wody (stary / nowy) i delty kafelków trzymane są
+w pamięci współdzielonej - procesy robocze nie kopiują macierzy, tylko pracują na widokach.
+"""
+
+# stan procesu roboczego: widoki na pamięć współdzieloną + opis kafelków
+worker_state = {}
+
+
+def make_tiles(shape, tile_size):
+    """Dzieli macierz o kształcie `shape` na kafelki; zwraca listę (r0, r1, c0, c1) komórek własnych."""
+    nrows, ncols = shape
+    return [
+        (r0, min(r0 + tile_size, nrows), c0, min(c0 + tile_size, ncols))
+        for r0 in range(0, nrows, tile_size)
+        for c0 in range(0, ncols, tile_size)
+    ]
+
+
+def halo_window(tile, shape):
+    """Okno kafelka poszerzone o jedną komórkę halo, przycięte do brzegu mapy."""
+    r0, r1, c0, c1 = tile
+    return max(r0 - 1, 0), min(r1 + 1, shape[0]), max(c0 - 1, 0), min(c1 + 1, shape[1])
+
+
+def halo_sources(tiles, windows):
+    """
+    Dla każdego kafelka lista wkładów z delt (swojej i sąsiadów):
+    (indeks kafelka-źródła, wycinek w delcie źródła, wycinek w komórkach własnych).
+    """
+    sources = []
+    for r0, r1, c0, c1 in tiles:
+        tile_sources = []
+        for idx, (wr0, wr1, wc0, wc1) in enumerate(windows):
+            ir0, ir1 = max(r0, wr0), min(r1, wr1)
+            ic0, ic1 = max(c0, wc0), min(c1, wc1)
+            if ir0 >= ir1 or ic0 >= ic1:
+                continue
+            src = (slice(ir0 - wr0, ir1 - wr0), slice(ic0 - wc0, ic1 - wc0))
+            dst = (slice(ir0 - r0, ir1 - r0), slice(ic0 - c0, ic1 - c0))
+            tile_sources.append((idx, src, dst))
+        sources.append(tile_sources)
+    return sources
+
+
+def attach_arrays(layout):
+    """Tworzy widoki ndarray na blokach pamięci współdzielonej opisanych w `layout`."""
+    blocks, arrays = [], {}
+    for name, (shm_name, shape, dtype) in layout.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return blocks, arrays
+
+
+def init_worker(layout, tiles, windows, delta_offsets, sources):
+    blocks, arrays = attach_arrays(layout)
+    worker_state.update(
+        blocks=blocks, arrays=arrays, tiles=tiles, windows=windows,
+        delta_offsets=delta_offsets, sources=sources,
+    )
+
+
+def tile_delta(state, idx, current, k):
+    """Faza 1: delta kafelka na oknie z halo, zapisana do jego bufora delty."""
+    arrays = state["arrays"]
+    wr0, wr1, wc0, wc1 = state["windows"][idx]
+    window = (slice(wr0, wr1), slice(wc0, wc1))
+    delta = flood_delta(
+        arrays["height"][window], arrays[f"water{current}"][window], k, arrays["roads_mask"][window]
+    )
+    start, stop = state["delta_offsets"][idx]
+    arrays["deltas"][start:stop] = delta.ravel()
+
+
+def tile_halo_exchange(state, idx, current):
+    """Faza 2: komórki własne = stara woda + delta własna + halo sąsiadów, wynik do drugiego bufora."""
+    arrays = state["arrays"]
+    r0, r1, c0, c1 = state["tiles"][idx]
+    new_tile = arrays[f"water{1 - current}"][r0:r1, c0:c1]
+    new_tile[...] = arrays[f"water{current}"][r0:r1, c0:c1]
+    for src_idx, src, dst in state["sources"][idx]:
+        wr0, wr1, wc0, wc1 = state["windows"][src_idx]
+        start, stop = state["delta_offsets"][src_idx]
+        src_delta = arrays["deltas"][start:stop].reshape(wr1 - wr0, wc1 - wc0)
+        new_tile[dst] += src_delta[src]
+    np.clip(new_tile, 0, None, out=new_tile)
+
+
+def run_phase(phase, idx, current, k):
+    if phase == "delta":
+        tile_delta(worker_state, idx, current, k)
+    else:
+        tile_halo_exchange(worker_state, idx, current)
+    return idx
+
+
+def worker_ready(_):
+    return os.getpid()
+
+
+class TiledFloodSolver:
+    """
+    Solver flood_step na kafelkach z halo, liczony w puli procesów na pamięci współdzielonej.
+
+    Woda trzymana jest w solverze - `solver.water` to widok na aktualny bufor, więc deszcz
+    i inne zmiany dodaje się w miejscu (`water += rain`), a krok robi się jak dotąd:
+        water = solver.step(k)
+    Po close() widoki zwrócone przez solver są nieważne - wynik trzeba wcześniej skopiować.
+
+    Parametry:
+    height: np.ndarray    - wysokość terenu (N x M)
+    roads_mask            - maska dróg (N x M)
+    water: np.ndarray     - początkowy słup wody (domyślnie zera)
+    workers: int          - liczba procesów; 1 = liczenie w procesie głównym (bez puli)
+    tile_size: int        - bok kafelka w komórkach
+    """
+
+    def __init__(self, height, roads_mask, water=None, workers=None, tile_size=512):
+        self.shape = height.shape
+        self.workers = workers or os.cpu_count()
+        self.tiles = make_tiles(self.shape, tile_size)
+        self.windows = [halo_window(t, self.shape) for t in self.tiles]
+        self.sources = halo_sources(self.tiles, self.windows)
+
+        self.delta_offsets = []
+        offset = 0
+        for wr0, wr1, wc0, wc1 in self.windows:
+            size = (wr1 - wr0) * (wc1 - wc0)
+            self.delta_offsets.append((offset, offset + size))
+            offset += size
+
+        specs = {
+            "height": (self.shape, height.dtype),
+            "roads_mask": (self.shape, np.bool_),
+            "water0": (self.shape, np.float64),
+            "water1": (self.shape, np.float64),
+            "deltas": ((offset,), np.float64),
+        }
+        self.blocks = []
+        self.layout = {}
+        self.arrays = {}
+        for name, (shape, dtype) in specs.items():
+            nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.blocks.append(shm)
+            self.layout[name] = (shm.name, shape, dtype)
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+        self.arrays["height"][...] = height
+        self.arrays["roads_mask"][...] = roads_mask
+        self.arrays["water0"][...] = 0.0 if water is None else water
+        self.current = 0
+
+        self.state = {
+            "arrays": self.arrays, "tiles": self.tiles, "windows": self.windows,
+            "delta_offsets": self.delta_offsets, "sources": self.sources,
+        }
+        self.pool = None
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_worker,
+                initargs=(self.layout, self.tiles, self.windows, self.delta_offsets, self.sources),
+            )
+            # wymuszamy start wszystkich procesów, żeby koszt startu nie wpadał do pierwszego kroku
+            list(self.pool.map(worker_ready, range(self.workers)))
+
+    @property
+    def water(self) -> np.ndarray:
+        return self.arrays[f"water{self.current}"]
+
+    def run_phase(self, phase, k):
+        indices = range(len(self.tiles))
+        if self.pool is None:
+            for idx in indices:
+                if phase == "delta":
+                    tile_delta(self.state, idx, self.current, k)
+                else:
+                    tile_halo_exchange(self.state, idx, self.current)
+        else:
+            n = len(self.tiles)
+            list(self.pool.map(run_phase, [phase] * n, indices, [self.current] * n, [k] * n))
+
+    def step(self, k: float) -> np.ndarray:
+        """Jeden krok przepływu na wszystkich kafelkach; zwraca widok na nowy stan wody."""
+        self.run_phase("delta", k)
+        self.run_phase("halo", k)
+        self.current = 1 - self.current
+        return self.water
+
+    def close(self):
+        """Zamyka pulę procesów i zwalnia pamięć współdzieloną."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self.arrays = {}
+        self.state = {}
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def benchmark_tiled(height, roads_mask, water, k=0.15, steps=5, workers=(1, 2, 4, None), tile_size=512):
+    """
+    Porównanie solvera kafelkowego dla różnej liczby procesów (None = wszystkie rdzenie).
+    Sprawdza zgodność z flood_step na całej mapie; zwraca listę słowników z wynikami.
+    """
+    reference = water.copy()
+    t0 = perf_counter()
+    for _ in range(steps):
+        reference = flood_step(height, reference, k, roads_mask)
+    single_step = (perf_counter() - t0) / steps
+
+    results = []
+    for n in workers:
+        t0 = perf_counter()
+        with TiledFloodSolver(height, roads_mask, water, workers=n, tile_size=tile_size) as solver:
+            startup = perf_counter() - t0
+            t0 = perf_counter()
+            for _ in range(steps):
+                solver.step(k)
+            step_time = (perf_counter() - t0) / steps
+            max_err = float(np.max(np.abs(solver.water - reference)))
+            results.append({
+                "workers": solver.workers,
+                "tiles": len(solver.tiles),
+                "startup_s": startup,
+                "step_s": step_time,
+                "single_tile_step_s": single_step,
+                "max_abs_diff": max_err,
+            })
+    return results
+
+
+if __name__ == "__main__":
+    import rasterio
+
+    # cały DEM Krakowa w natywnej rozdzielczości
+    with rasterio.open("krakow_merged.tif") as src:
+        height = src.read(1).astype(np.float64)
+
+    roads_mask = np.zeros(height.shape, dtype=bool)
+    water = np.full(height.shape, 0.02)
+
+    print(f"DEM: {height.shape[0]} x {height.shape[1]}")
+    print(f"{'workers':>8} {'tiles':>6} {'startup [s]':>12} {'krok [s]':>10} {'1 kafelek [s]':>14} {'max |diff|':>11}")
+    for r in benchmark_tiled(height, roads_mask, water):
+        print(f"{r['workers']:>8} {r['tiles']:>6} {r['startup_s']:>12.3f} {r['step_s']:>10.3f} "
+              f"{r['single_tile_step_s']:>14.3f} {r['max_abs_diff']:>11.2e}")
@@ -0,0 +1,237 @@
+"""
+Parameter sweep / Monte Carlo runner for TestModel scenarios.
+
+Every run is headless, has an explicit seed and a stable id (hash of its parameters),
+and is executed in a process pool. One row of metrics per finished run is appended to
+<out>/results.csv, so an interrupted sweep is resumed by starting it again with the
+same arguments: runs whose id is already in the table are skipped. The rest of the run
+configuration (steps, model options, input files) is written to <out>/sweep.json, and a
+sweep is not resumed into a directory whose configuration differs, so results.csv only
+holds comparable rows.
+
+Workers load the road graph from its binary cache (Data/<name>.graph.npz) and read flood
+frames from the memory-mapped FloodStore, so the read-only data comes from shared files
+(and the OS page cache) instead of being parsed by every run.
+
+Example:
+    python sweep.py --n-agents 30 100 300 --n-rescue-agents 5 10 --replicates 20 --workers 8
+"""
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from evac_model import TestModel, build_example_graph
+from agent_model.agent_store import CITIZEN, RESCUER
+from agent_model.citizens.citizen_agent import CitizenDecisionMakingMode, CitizenState
+from agent_model.event_log import LEVEL_NAMES
+from agent_model.rescue_agent import RescueState
+
+RESULT_FIELDS = [
+    "run_id", "seed", "replicate", "params", "steps", "wall_time",
+    "citizens", "rescuers", "safe", "unsafe", "critically_unsafe", "rescued",
+    "rescuers_available", "rescuers_on_mission", "rescuers_carrying", "unsafe_edges",
+]
+
+
+def expand_grid(grid, replicates, base_seed=0):
+    """
+    Run specifications for the cartesian product of `grid` (name -> list of values)
+    times `replicates`. Replicate seeds are independent streams spawned from `base_seed`;
+    replicate r gets the same seed in every parameter combination (common random numbers).
+    """
+    names = list(grid)
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(base_seed).spawn(replicates)]
+    runs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        for r, seed in enumerate(seeds):
+            runs.append({"run_id": run_id(params, seed), "seed": seed, "replicate": r, "params": params})
+    return runs
+
+
+def run_id(params, seed):
+    key = json.dumps({"params": params, "seed": seed}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+def decision_mix(mix):
+    """{"RANDOM": 1, "DIJIKSTRA": 2, ...} -> list of decision modes with repeats as weights."""
+    return [CitizenDecisionMakingMode[name] for name, weight in mix.items() for _ in range(int(weight))]
+
+
+def run_scenario(run, graph_path, flood_path, dem_path, out_dir, steps, model_kwargs):
+    """Runs one scenario headless and returns its row of metrics (same seed -> same trajectories)."""
+    params = dict(run["params"])
+    if "decision_modes" in params:
+        params["decision_modes"] = decision_mix(params["decision_modes"])
+    log_path = os.path.join(out_dir, "runs", run["run_id"])
+    os.makedirs(log_path, exist_ok=True)
+
+    start = time.perf_counter()
+    model = TestModel(roads_graph=build_example_graph(graph_path), dem_path=dem_path, log_path=log_path,
+                      flood_path=flood_path, render=None, seed=run["seed"], **model_kwargs, **params)
+    for _ in range(steps):
+        model.step()
+    model.close()
+    wall_time = time.perf_counter() - start
+
+    return {
+        "run_id": run["run_id"], "seed": run["seed"], "replicate": run["replicate"],
+        "params": json.dumps(run["params"], sort_keys=True), "steps": steps, "wall_time": round(wall_time, 4),
+        **run_metrics(model),
+    }
+
+
+def run_metrics(model):
+    """End-of-run counts of citizens per state, rescuers per state and unsafe edges."""
+    store = model.agent_store
+    citizens = store.state[store.slots(CITIZEN)]
+    rescuers = store.state[store.slots(RESCUER)]
+    return {
+        "citizens": len(citizens),
+        "rescuers": len(rescuers),
+        "safe": int(np.count_nonzero(citizens == CitizenState.SAFE.value)),
+        "unsafe": int(np.count_nonzero(citizens == CitizenState.UNSAFE.value)),
+        "critically_unsafe": int(np.count_nonzero(citizens == CitizenState.CRITICALLY_UNSAFE.value)),
+        "rescued": int(np.count_nonzero(citizens == CitizenState.RESCUED.value)),
+        "rescuers_available": int(np.count_nonzero(rescuers == RescueState.AVAILABLE)),
+        "rescuers_on_mission": int(np.count_nonzero(rescuers == RescueState.ON_MISSION)),
+        "rescuers_carrying": int(np.count_nonzero(rescuers == RescueState.CARRYING)),
+        "unsafe_edges": int(np.count_nonzero(~model.edge_safe)),
+    }
+
+
+def completed_runs(results_path):
+    """Ids of the runs already present in the results table."""
+    if not os.path.exists(results_path):
+        return set()
+    with open(results_path, newline="") as f:
+        return {row["run_id"] for row in csv.DictReader(f)}
+
+
+def input_identity(path):
+    """Path, size and modification time of an input file (None for a missing file)."""
+    if path is None or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def sweep_config(graph_path, flood_path, dem_path, steps, model_kwargs):
+    """Everything apart from the run parameters and seeds that determines the results of a sweep."""
+    config = {
+        "steps": steps,
+        "model_kwargs": model_kwargs,
+        "inputs": {"graph": input_identity(graph_path), "flood": input_identity(flood_path),
+                   "dem": input_identity(dem_path)},
+    }
+    return json.loads(json.dumps(config, sort_keys=True, default=str))
+
+
+def check_config(out_dir, config):
+    """
+    Writes the sweep configuration to <out_dir>/sweep.json, or compares it with the stored one
+    when resuming. Raises ValueError if they differ (the finished runs would not be comparable).
+    """
+    config_path = os.path.join(out_dir, "sweep.json")
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            stored = json.load(f)
+        if stored != config:
+            changed = sorted(key for key in set(stored) | set(config) if stored.get(key) != config.get(key))
+            raise ValueError(f"Sweep in {out_dir} was run with a different configuration ({', '.join(changed)}); "
+                             f"use another output directory")
+        return
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=2, sort_keys=True)
+
+
+def run_sweep(runs, out_dir, graph_path, flood_path, dem_path, steps, workers=None, model_kwargs=None):
+    """
+    Executes `runs` (see expand_grid) in a process pool, appending one row per finished run
+    to <out_dir>/results.csv. Runs already in the table are skipped; resuming with a different
+    configuration (steps, model_kwargs, input files) raises ValueError. Returns the results path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    check_config(out_dir, sweep_config(graph_path, flood_path, dem_path, steps, model_kwargs or {}))
+    results_path = os.path.join(out_dir, "results.csv")
+    done = completed_runs(results_path)
+    pending = [run for run in runs if run["run_id"] not in done]
+    print(f"{len(runs)} runs, {len(done)} already done, {len(pending)} to run")
+    if not pending:
+        return results_path
+
+    # builds the graph cache once before the workers start
+    build_example_graph(graph_path)
+
+    new_file = not os.path.exists(results_path)
+    with open(results_path, "a", newline="") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        if new_file:
+            writer.writeheader()
+        futures = {
+            pool.submit(run_scenario, run, graph_path, flood_path, dem_path, out_dir, steps, model_kwargs or {}): run
+            for run in pending
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            run = futures[future]
+            try:
+                row = future.result()
+            except Exception as e:
+                print(f"[{i}/{len(pending)}] run {run['run_id']} failed: {e!r}")
+                continue
+            writer.writerow(row)
+            f.flush()
+            print(f"[{i}/{len(pending)}] run {run['run_id']} done in {row['wall_time']} s")
+    return results_path
+
+
+def parse_mix(text):
+    """Parses "RANDOM=1,DIJIKSTRA=2,FOLLOWER=2" into {"RANDOM": 1, "DIJIKSTRA": 2, "FOLLOWER": 2}."""
+    return {name: int(weight) for name, weight in (item.split("=") for item in text.split(","))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep of TestModel scenarios")
+    parser.add_argument("--out", default="output/sweep")
+    parser.add_argument("--graph", default="Data/krakow_roads2.graphml")
+    parser.add_argument("--flood", default="Data/flood_run.flood")
+    parser.add_argument("--dem", default="krakow_merged.tif")
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--replicates", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--n-agents", type=int, nargs="+", default=[30])
+    parser.add_argument("--n-rescue-agents", type=int, nargs="+", default=[5])
+    parser.add_argument("--safety-spots", nargs="+", default=["13,40"],
+                        help="comma-separated node ids, one set per value")
+    parser.add_argument("--decision-modes", nargs="+", default=None,
+                        help="mixes such as RANDOM=1,DIJIKSTRA=2,FOLLOWER=2")
+    parser.add_argument("--agent-backend", default="objects", choices=["objects", "arrays"])
+    parser.add_argument("--log-level", default="WARNING", choices=list(LEVEL_NAMES.values()))
+    args = parser.parse_args()
+
+    grid = {
+        "n_agents": args.n_agents,
+        "n_rescue_agents": args.n_rescue_agents,
+        "safety_spots": [[int(n) for n in spots.split(",")] for spots in args.safety_spots],
+    }
+    if args.decision_modes:
+        grid["decision_modes"] = [parse_mix(mix) for mix in args.decision_modes]
+    levels = {name: value for value, name in LEVEL_NAMES.items()}
+
+    try:
+        run_sweep(
+            expand_grid(grid, args.replicates, args.seed), args.out, args.graph, args.flood, args.dem, args.steps,
+            workers=args.workers,
+            model_kwargs={"agent_backend": args.agent_backend, "log_level": levels[args.log_level]},
+        )
+    except ValueError as e:
+        parser.error(str(e))
@@ -0,0 +1,55 @@
+"""
+The "arrays" agent backend (CitizenAgent.step_batch) against the "objects" backend (CitizenAgent.step one by one).
+
+Both backends must give the same run: the same edge, progress, speed and state of every agent after every step,
+for every decision mode. FOLLOWER citizens copy the edge of citizens at their node, so they are the case where
+the order of decisions and moves within a step matters.
+"""
+import pytest
+
+from agent_model.citizens.citizen_agent import CitizenAgent, CitizenDecisionMakingMode
+from benchmarks.suite import make_model
+
+STEPS = 60
+
+
+@pytest.fixture(scope="module")
+def fixture_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("fixtures"))
+
+
+def trajectory(fixture_dir, agent_backend, decision_modes, n_citizens=200, n_rescuers=3):
+    model, close, _ = make_model("4k", n_citizens, n_rescuers, fixture_dir, frame=0,
+                                 agent_backend=agent_backend, decision_modes=decision_modes)
+    steps = []
+    try:
+        for _ in range(STEPS):
+            model.step()
+            steps.append([(agent.unique_id, agent.current_edge, round(float(agent.progress), 9),
+                           round(float(getattr(agent, "current_speed", 0.0)), 9), str(agent.state)) for agent in model.agents])
+    finally:
+        close()
+    return steps
+
+
+@pytest.mark.parametrize("decision_modes", [
+    [CitizenDecisionMakingMode.RANDOM],
+    [CitizenDecisionMakingMode.DIJIKSTRA],
+    [CitizenDecisionMakingMode.FOLLOWER],
+    None,  # DEFAULT_DECISION_MODES
+], ids=["random", "dijkstra", "follower", "default"])
+def test_arrays_backend_matches_objects(fixture_dir, decision_modes):
+    objects = trajectory(fixture_dir, "objects", decision_modes)
+    arrays = trajectory(fixture_dir, "arrays", decision_modes)
+    for step, (expected, got) in enumerate(zip(objects, arrays)):
+        assert got == expected, f"first difference at step {step}"
+
+
+def test_followers_are_moved_before_deciding(fixture_dir, monkeypatch):
+    """With FOLLOWER citizens step_batch moves the citizens before a follower in several batches."""
+    batches = []
+    move_batch = CitizenAgent.move_batch
+    monkeypatch.setattr(CitizenAgent, "move_batch",
+                        staticmethod(lambda model, slots: (batches.append(len(slots)), move_batch(model, slots))))
+    trajectory(fixture_dir, "arrays", [CitizenDecisionMakingMode.FOLLOWER])
+    assert len(batches) > STEPS